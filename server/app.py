@@ -0,0 +1,409 @@
+import sys
+import os
+import time
+import json
+import hashlib
+import tempfile
+import webbrowser
+import traceback
+import anyio
+from contextlib import asynccontextmanager
+from typing import List, Dict, Callable,Any,Optional
+
+from fastapi import FastAPI, File, UploadFile, HTTPException,Body,Response
+from fastapi.responses import StreamingResponse, FileResponse
+from fastapi.staticfiles import StaticFiles
+from fastapi.middleware.cors import CORSMiddleware
+from pydantic import BaseModel, Field
+
+from common import get_local_ip,get_app_path,shutdown_process_pool
+from nlp_service import segment_text_content, find_vocab_matches, split_matches, refresh_vocab_index, analyze_text, segment_texts
+from text_processors import extract_with_language, iter_extract_with_language, ExtractOptions
+from translator import translate_text, translate_batch, translator_metrics, scheduler_stats, close_translator_clients, configure_translator
+from tts import generate_audio_stream, generate_audio_stream_chunked
+from tts_cache import tts_cache, tts_prefetcher
+from storage import storage
+from doc_cache import doc_cache
+from preanalysis import preanalyzer
+from translation_memory import translation_memory
+
+# --- 配置 ---
+HOST = "0.0.0.0"
+PORT = 8000
+BASE_URL = f"http://127.0.0.1:{PORT}"
+# 当前文档在存储中的名称
+CURRENT_DOC = 'currentDoc'
+# 文档提取使用的进程数，1 为单进程；多核机器上调大可加速大型 PDF、EPUB
+# 子进程（spawn）只会重新导入轻量的入口 main.py，不会加载模型、打开存储
+EXTRACT_WORKERS = int(os.environ.get("DEEPREADER_EXTRACT_WORKERS", "1"))
+# /segment_batch 的 nlp.pipe 进程数上限
+SEGMENT_MAX_PROCESSES = os.cpu_count() or 1
+# 上传文档后在后台预先做意群切分和生词匹配（可选，会在后台线程中持续占用 CPU），默认关闭
+PREANALYSIS_ENABLED = os.environ.get("DEEPREADER_PREANALYSIS", "0") == "1"
+# 朗读某段时在后台预先合成其后多少段，0 为关闭
+TTS_PREFETCH = int(os.environ.get("DEEPREADER_TTS_PREFETCH", "3"))
+# 各翻译引擎的限速参数（JSON），未指定的沿用默认值，例如
+# {"bing": {"rate": 2, "concurrency": 1}, "deepl": {"rate": 10, "burst": 20, "concurrency": 8}}
+TRANSLATOR_LIMITS: Dict[str, Dict[str, float]] = json.loads(os.environ.get("DEEPREADER_TRANSLATOR_LIMITS", "{}"))
+for _name, _limits in TRANSLATOR_LIMITS.items():
+    configure_translator(_name, **_limits)
+
+# --- 生命周期管理 & 自动开启浏览器 ---
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    print("System starting up... Models loaded.")
+    local_ip = get_local_ip()
+    print("=" * 50)
+    print(f"本机访问: http://127.0.0.1:{PORT}")
+    print(f"局域网访问: http://{local_ip}:{PORT}")
+    print("=" * 50)
+    # 在服务启动时打开浏览器，避免阻塞
+    try:
+        webbrowser.open(BASE_URL)
+        print(f"Browser opened at {BASE_URL}")
+    except Exception as e:
+        print(f"Failed to open browser: {e}")
+    if PREANALYSIS_ENABLED:
+        preanalyzer.start()
+    yield
+    print("System shutting down...")
+    preanalyzer.stop()
+    await close_translator_clients()
+    shutdown_process_pool()
+
+app = FastAPI(title="Doc Learner", lifespan=lifespan,openapi_url=None, docs_url=None, redoc_url=None)
+
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+
+# --- Pydantic Models ---
+class SegmentRequest(BaseModel):
+    text: str
+
+class SegmentBatchRequest(BaseModel):
+    texts: List[str]
+    batch_size: int = Field(64, ge=1, le=1000)
+    n_process: int = Field(1, ge=1)
+
+class AnalyzeRequest(BaseModel):
+    text: str
+    vocab: bool = True
+
+class VocabMatchRequest(BaseModel):
+    text_list: List[str]
+    # text_list 为某段的意群时传入该段原文，匹配规则与 /analyze 相同
+    paragraph: Optional[str] = None
+
+class TranslationRequest(BaseModel):
+    text: str = Field(..., min_length=1)
+    translator: str = "bing"
+    from_lang: str = "auto"
+    to_lang: str = "en"
+
+class TranslationResponse(BaseModel):
+    original_text: str
+    translated_text: str
+    translator: str
+    status: str = "success"
+    cached: bool = False
+
+class TranslationBatchRequest(BaseModel):
+    texts: List[str]
+    translator: str = "bing"
+    from_lang: str = "auto"
+    to_lang: str = "en"
+
+class TranslationBatchResponse(BaseModel):
+    translations: List[str]
+    translator: str
+    cached: int = 0
+
+class TTSRequest(BaseModel):
+    text: str
+    voice: str = "zh-CN-XiaoxiaoNeural"
+    rate: str = "+0%"
+    # 朗读的是 currentDoc 中的第几段，提供时会预合成后续段落
+    index: Optional[int] = None
+    # 按句切分并行合成，长段落可以更快开始播放
+    chunked: bool = False
+
+# --- Endpoints ---
+
+def _save_upload(file: UploadFile):
+    """把上传文件写入临时文件，同时计算内容的 SHA-256，返回 (路径, 扩展名, 哈希)"""
+    _, file_ext = os.path.splitext(file.filename.lower())
+    hasher = hashlib.sha256()
+    with tempfile.NamedTemporaryFile(delete=False, suffix=file_ext) as tmp_file:
+        while chunk := file.file.read(1024 * 1024):
+            hasher.update(chunk)
+            tmp_file.write(chunk)
+    return tmp_file.name, file_ext, hasher.hexdigest()
+
+@app.post("/upload")
+def upload_and_extract(file: UploadFile = File(...)):
+    tmp_path, file_ext, file_hash = _save_upload(file)
+    try:
+        options = ExtractOptions()
+        cache_key = doc_cache.make_key(file_hash, file_ext, options)
+        data = doc_cache.get(cache_key)
+        if data is None:
+            data=extract_with_language(tmp_path, workers=EXTRACT_WORKERS, options=options)
+            # 空结果多半是文件损坏或提取失败，不缓存
+            if data:
+                doc_cache.set(cache_key, data)
+        storage.set_document(CURRENT_DOC, data)
+        if PREANALYSIS_ENABLED:
+            preanalyzer.start()
+        return data
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=f"Processing failed: {str(e)}")
+    finally:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+
+@app.post("/upload_stream")
+def upload_and_extract_stream(file: UploadFile = File(...)):
+    """
+    流式版本的 /upload：以 NDJSON 逐行返回 {"text", "lang"}，
+    前端收到第一批段落即可渲染，全部完成后再写入 currentDoc
+    """
+    tmp_path, file_ext, file_hash = _save_upload(file)
+    # 流式提取与 /upload 的结果可能不同（PDF 正文字号按采样页估计），缓存键中区分
+    options = ExtractOptions(streaming=True)
+    cache_key = doc_cache.make_key(file_hash, file_ext, options)
+    try:
+        cached = doc_cache.get(cache_key)
+        if cached is not None:
+            items = iter(cached)
+        else:
+            items = iter_extract_with_language(tmp_path, workers=EXTRACT_WORKERS, options=options)
+        # 先取出第一段，格式不支持等错误仍能以正常的 HTTP 状态码返回
+        first = next(items, None)
+    except ValueError as e:
+        os.unlink(tmp_path)
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        traceback.print_exc()
+        os.unlink(tmp_path)
+        raise HTTPException(status_code=500, detail=f"Processing failed: {str(e)}")
+
+    def ndjson_lines():
+        data = []
+        try:
+            if first is not None:
+                data.append(first)
+                yield json.dumps(first, ensure_ascii=False) + "\n"
+            for item in items:
+                data.append(item)
+                yield json.dumps(item, ensure_ascii=False) + "\n"
+            if cached is None and data:
+                doc_cache.set(cache_key, data)
+            storage.set_document(CURRENT_DOC, data)
+            if PREANALYSIS_ENABLED:
+                preanalyzer.start()
+        except Exception as e:
+            traceback.print_exc()
+            yield json.dumps({"error": f"Processing failed: {str(e)}"}, ensure_ascii=False) + "\n"
+        finally:
+            if hasattr(items, "close"):
+                items.close()
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+
+    return StreamingResponse(ndjson_lines(), media_type="application/x-ndjson")
+
+@app.get("/api/doc_cache")
+def get_doc_cache_stats():
+    return doc_cache.stats()
+
+@app.delete("/api/doc_cache")
+def purge_doc_cache(key: Optional[str] = None):
+    return {"removed": doc_cache.purge(key)}
+
+@app.get("/api/preanalysis")
+def get_preanalysis_status():
+    """后台预分析进度：state 为 idle/running/done/cancelled/error"""
+    return {"enabled": PREANALYSIS_ENABLED, **preanalyzer.status()}
+
+@app.post("/segment")
+def segment_sentence(request: SegmentRequest):
+    # 简化判空逻辑
+    if not request.text: return {"segments": []}
+    try:
+        return {"segments": segment_text_content(request.text)}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Seg failed: {str(e)}")
+
+@app.post("/segment_batch")
+def segment_batch(request: SegmentBatchRequest):
+    """批量版 /segment：一次请求处理多个段落，results[i] 对应 texts[i]"""
+    if not request.texts: return {"results": []}
+    try:
+        n_process = min(request.n_process, SEGMENT_MAX_PROCESSES)
+        return {"results": segment_texts(request.texts, batch_size=request.batch_size, n_process=n_process)}
+    except Exception as e:
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=f"Seg failed: {str(e)}")
+
+@app.post("/analyze")
+def analyze_paragraph(request: AnalyzeRequest):
+    """/segment 与 /match_vocab 的合并版本：一次请求返回意群和各意群的匹配，匹配位置相对于各意群"""
+    if not request.text: return {"segments": [], "matches": []}
+    try:
+        return analyze_text(request.text, with_vocab=request.vocab)
+    except Exception as e:
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=f"Analyze failed: {str(e)}")
+
+@app.post("/match_vocab")
+def match_vocabulary(request: VocabMatchRequest, response: Response):
+    try:
+        # 词库只在 vocabs 写入后重新同步，其余请求的开销只与文本长度有关
+        t0 = time.perf_counter()
+        vocab_size = refresh_vocab_index()
+        t1 = time.perf_counter()
+        if not vocab_size or not request.text_list: return []
+        if request.paragraph:
+            # 在整段上匹配再按意群拆分，意群单独匹配时词形还原缺少上下文
+            result = split_matches(request.paragraph, request.text_list, find_vocab_matches([request.paragraph])[0])
+        else:
+            result = find_vocab_matches(request.text_list)
+        t2 = time.perf_counter()
+        response.headers["Server-Timing"] = f"vocab;dur={(t1 - t0) * 1000:.1f}, match;dur={(t2 - t1) * 1000:.1f}"
+        return result
+    except Exception as e:
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=f"Vocabulary matching failed: {str(e)}")
+
+@app.post("/translate", response_model=TranslationResponse)
+async def translate_api(request: TranslationRequest):
+    try:
+        # 翻译记忆命中时不访问翻译服务；SQLite 读写放到线程中，不阻塞事件循环
+        key = (request.text, request.translator, request.from_lang, request.to_lang)
+        result = await anyio.to_thread.run_sync(translation_memory.get, *key)
+        cached = result is not None
+        if not cached:
+            result = str(await translate_text(**request.model_dump()))
+            await anyio.to_thread.run_sync(translation_memory.set, *key, result)
+        return TranslationResponse(
+            original_text=request.text,
+            translated_text=result,
+            translator=request.translator,
+            cached=cached
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Trans failed: {str(e)}")
+
+@app.post("/translate_batch", response_model=TranslationBatchResponse)
+async def translate_batch_api(request: TranslationBatchRequest):
+    """批量翻译，translations[i] 对应 texts[i]；翻译记忆中已有的段落不再请求翻译服务"""
+    langs = (request.translator, request.from_lang, request.to_lang)
+    try:
+        texts = list(dict.fromkeys(text for text in request.texts if text.strip()))
+        memory = dict(zip(texts, await anyio.to_thread.run_sync(translation_memory.get_many, texts, *langs)))
+        translations = [memory[text] if text.strip() else "" for text in request.texts]
+        cached = sum(1 for text, t in zip(request.texts, translations) if t and text.strip())
+        # 未命中的段落去重后一起翻译
+        missing = list(dict.fromkeys(text for text, t in zip(request.texts, translations) if t is None))
+        if missing:
+            results = dict(zip(missing, await translate_batch(missing, request.translator, request.to_lang, request.from_lang)))
+            await anyio.to_thread.run_sync(translation_memory.set_many, results, *langs)
+            translations = [results[text] if t is None else t for text, t in zip(request.texts, translations)]
+        return TranslationBatchResponse(translations=translations, translator=request.translator, cached=cached)
+    except Exception as e:
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=f"Trans failed: {str(e)}")
+
+@app.get("/api/translator_metrics")
+def get_translator_metrics():
+    """翻译服务调用的耗时统计、DeepL 客户端复用次数和各引擎调度器状态"""
+    return {**translator_metrics.snapshot(), "schedulers": scheduler_stats()}
+
+@app.get("/api/translation_memory")
+def get_translation_memory_stats():
+    return translation_memory.stats()
+
+@app.delete("/api/translation_memory")
+def invalidate_translation_memory(translator: Optional[str] = None):
+    """删除某个翻译引擎的缓存译文，未指定时全部删除"""
+    return {"removed": translation_memory.invalidate(translator)}
+
+async def _tts_response(text: str, voice: str, rate: str, chunked: bool = False):
+    """命中缓存时直接返回文件（支持 Range），否则边合成边返回并写入缓存"""
+    if not text:
+        raise HTTPException(status_code=400, detail="Text required")
+    key = tts_cache.make_key(text, voice, rate, chunked)
+    # 逐句合成只是为了更快出声，已有的整段音频（例如预合成的）同样可用
+    keys = [key, tts_cache.make_key(text, voice, rate)] if chunked else [key]
+    path = None
+    for k in keys:
+        await tts_prefetcher.wait(k)
+        if path := await tts_cache.get(k):
+            break
+    if path:
+        return FileResponse(path, media_type="audio/mpeg", filename="tts_audio.mp3", headers={"X-TTS-Cache": "hit"})
+    stream = generate_audio_stream_chunked(text, voice, rate) if chunked else generate_audio_stream(text, voice, rate)
+    return StreamingResponse(
+        tts_cache.tee(key, stream),
+        media_type="audio/mpeg",
+        headers={"Content-Disposition": "attachment; filename=tts_audio.mp3", "X-TTS-Cache": "miss"}
+    )
+
+async def _prefetch_following(index: int, text: str, voice: str, rate: str):
+    """朗读的是第 index 段原文时，预合成其后 TTS_PREFETCH 段中语言相同的原文"""
+    # 读取 SQLite 并反序列化段落块，放到线程中，不阻塞事件循环
+    paragraphs = await anyio.to_thread.run_sync(storage.get_paragraphs, CURRENT_DOC, index, index + 1 + TTS_PREFETCH)
+    if not paragraphs or paragraphs[0]["text"] != text:
+        return
+    lang = paragraphs[0]["lang"]
+    await tts_prefetcher.schedule([(p["text"], voice, rate) for p in paragraphs[1:] if p["lang"] == lang and p["text"]])
+
+@app.post("/tts")
+async def tts_post_endpoint(request: TTSRequest):
+    if TTS_PREFETCH and request.index is not None:
+        await _prefetch_following(request.index, request.text, request.voice, request.rate)
+    return await _tts_response(request.text, request.voice, request.rate, request.chunked)
+
+@app.get("/tts")
+async def tts_get_endpoint(text: str, voice: str = "zh-CN-XiaoxiaoNeural", rate: str = "+0%", index: Optional[int] = None, chunked: bool = False):
+    """GET 版本，可直接作为 <audio> 的 src，缓存命中时浏览器可以按 Range 拖动"""
+    if TTS_PREFETCH and index is not None:
+        await _prefetch_following(index, text, voice, rate)
+    return await _tts_response(text, voice, rate, chunked)
+
+@app.get("/api/tts_cache")
+def get_tts_cache_stats():
+    return {**tts_cache.stats(), "prefetch": tts_prefetcher.stats()}
+
+@app.delete("/api/tts_cache")
+def purge_tts_cache():
+    return {"removed": tts_cache.purge()}
+@app.get("/api/document")
+def get_document_manifest():
+    """当前文档的清单，count 为段落总数"""
+    return storage.get_document_manifest(CURRENT_DOC) or {"count": 0}
+@app.get("/api/document/paragraphs")
+def get_document_paragraphs(start: int = 0, end: Optional[int] = None):
+    """按下标范围 [start, end) 读取当前文档的段落"""
+    return storage.get_paragraphs(CURRENT_DOC, start, end)
+# 普通 def：存储读写在线程池中执行，不阻塞事件循环
+@app.get("/api/storage/{key}")
+def get_item(key: str):
+    return storage.get(key)
+@app.put("/api/storage/{key}")
+def set_item(key: str, value: Any = Body(...)):
+    storage.set(key, value)
+    # 词库变化后之前的匹配结果失效，重新预分析
+    if key == 'vocabs' and PREANALYSIS_ENABLED:
+        preanalyzer.start()
+static_dist_path = os.path.join(get_app_path(), "dist")
+# 静态文件挂载放在最后，避免覆盖 API 路由
+app.mount("/", StaticFiles(directory=static_dist_path, html=True), name="static")
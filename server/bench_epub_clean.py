@@ -0,0 +1,143 @@
+"""
+EPUB 清洗基准：对比 BeautifulSoup 版本（clean_html_advanced）与 lxml 单次遍历版本
+（clean_xhtml_lxml）的速度，并检查两者输出完全一致。
+
+用法：
+    python bench_epub_clean.py [EPUB 文件 ...]
+
+不带参数时只运行内置的回归语料（手写用例 + 固定种子生成的随机文档）；
+带参数时额外对每本书的所有 spine 文档逐一对比并计时。
+"""
+import sys
+import time
+import random
+import zipfile
+import posixpath
+from xml.etree import ElementTree
+from epub_util import clean_html_advanced, clean_xhtml_lxml
+
+XHTML_HEAD = '<?xml version="1.0" encoding="utf-8"?>\n<html xmlns="http://www.w3.org/1999/xhtml" xmlns:epub="http://www.idpf.org/2007/ops"><head><title>T</title><style>p{}</style></head>'
+
+CASES = [
+    # 基本段落与去重
+    '<body><p>Hello  world</p><p>Hello world</p><h1>Title</h1></body>',
+    # 嵌套内容标签只输出最外层
+    '<body><li>Item <p>inner <b>bold</b></p> tail</li><blockquote><p>quoted</p></blockquote></body>',
+    # 删除的标签保留其后的文本
+    '<body><p>before<script>var x = 1;</script>after <span class="footnote">note</span>end</p></body>',
+    # 噪音 class（子串匹配）、隐藏元素
+    '<body><p class="header-text">shadow</p><p class="Main">kept</p><div style="color:red; DISPLAY : none">hidden</div><p hidden="hidden">h2</p></body>',
+    # 注释与处理指令不算文本，但其后的文本保留
+    '<body><p>a<!-- comment -->b<?pi data?>c</p></body>',
+    # 图片 alt：删除之前收集，位置固定在最后
+    '<body><p>text<img alt=" pic " src="a.png"/></p><aside><img alt="in aside"/></aside><img alt="  "/></body>',
+    # 无 body：整篇文档
+    '<div><p>no body</p><td>cell</td></div>',
+    # 第一个 body 之外的内容被忽略
+    '<div><p>outside</p><body><p>inside</p></body><body><p>second body</p></body></div>',
+    # 内容标签包含 body
+    '<div><td>cell <body><p>nested in td</p></body></td></div>',
+    # CDATA、实体、空白
+    '<body><p><![CDATA[raw <text>]]> &amp; &#169;\n\t more</p><pre>  a\n  b  </pre></body>',
+    # 带前缀的元素与大写标签
+    '<body><epub:switch><p>switch</p></epub:switch><P>upper</P><svg xmlns="http://www.w3.org/2000/svg"><text>svg text</text></svg></body>',
+    # template 中的内容不显示（BeautifulSoup 把其中的字符串视为 TemplateString，不计入文本）
+    '<body><p>x</p><template><p>hidden?</p></template><p>a<template>t<img alt="in template"/></template>tail</p></body>',
+    # 空内容与只有空白的内容
+    '<body><p>   </p><p/><li><span> </span></li><dd>x</dd></body>',
+]
+
+TAGS = ['p', 'div', 'span', 'li', 'ul', 'td', 'tr', 'table', 'h2', 'b', 'i', 'blockquote',
+        'script', 'template', 'nav', 'aside', 'section', 'img', 'br', 'a', 'figcaption', 'pre', 'em']
+# 与 html.parser 的解析结果相同的前提：空元素没有内容，script 中只有文本
+EMPTY_TAGS = {'img', 'br'}
+RAW_TEXT_TAGS = {'script'}
+CLASSES = ['', 'footnote', 'sidebar', 'banner', 'ad', 'read', 'normal', 'Chapter', 'text']
+WORDS = ['alpha', 'beta', 'gamma', 'delta', '中文', 'x', 'A long sentence.', '  ', '\n', 'beta']
+
+def random_element(rng, depth):
+    tag = rng.choice(TAGS)
+    attrs = ''
+    if rng.random() < 0.3:
+        attrs += f' class="{rng.choice(CLASSES)} {rng.choice(CLASSES)}"'
+    if rng.random() < 0.05:
+        attrs += ' style="display: none"'
+    if rng.random() < 0.03:
+        attrs += ' hidden=""'
+    if tag in EMPTY_TAGS:
+        if tag == 'img':
+            attrs += f' alt="{rng.choice(WORDS)}"'
+        return f'<{tag}{attrs}/>' + (rng.choice(WORDS) if rng.random() < 0.5 else '')
+    if tag in RAW_TEXT_TAGS:
+        return f'<{tag}{attrs}>{rng.choice(WORDS)}</{tag}>'
+    parts = []
+    for _ in range(rng.randint(0, 4)):
+        r = rng.random()
+        if r < 0.45 or depth > 5:
+            parts.append(rng.choice(WORDS))
+        elif r < 0.5:
+            parts.append(f'<!--{rng.choice(WORDS)}-->')
+        else:
+            parts.append(random_element(rng, depth + 1))
+    return f'<{tag}{attrs}>{"".join(parts)}</{tag}>' + (rng.choice(WORDS) if rng.random() < 0.3 else '')
+
+def regression_corpus(n_random=300, seed=0):
+    docs = [XHTML_HEAD + case + '</html>' for case in CASES]
+    rng = random.Random(seed)
+    for _ in range(n_random):
+        body = ''.join(random_element(rng, 0) for _ in range(rng.randint(1, 8)))
+        docs.append(XHTML_HEAD + f'<body>{body}</body></html>')
+    return docs
+
+def check(docs, label):
+    mismatches = 0
+    fallbacks = 0
+    for i, doc in enumerate(docs):
+        expected = clean_html_advanced(doc)
+        actual = clean_xhtml_lxml(doc)
+        if actual is None:
+            fallbacks += 1
+            continue
+        if actual != expected:
+            mismatches += 1
+            if mismatches <= 3:
+                print(f"MISMATCH in {label} #{i}:\n  bs4 ={expected}\n  lxml={actual}")
+    print(f"{label}: {len(docs)} documents, {mismatches} mismatches, {fallbacks} fell back to bs4")
+    return mismatches == 0
+
+def spine_documents(epub_path):
+    """按 spine 顺序读取 EPUB 中的内容文档（原始字节）"""
+    with zipfile.ZipFile(epub_path) as zf:
+        container = ElementTree.fromstring(zf.read('META-INF/container.xml'))
+        opf_path = container.find('.//{*}rootfile').get('full-path')
+        opf = ElementTree.fromstring(zf.read(opf_path))
+        base = posixpath.dirname(opf_path)
+        manifest = {item.get('id'): item.get('href') for item in opf.findall('.//{*}item')}
+        docs = []
+        for itemref in opf.findall('.//{*}itemref'):
+            href = manifest.get(itemref.get('idref'))
+            if href:
+                docs.append(zf.read(posixpath.normpath(posixpath.join(base, href))))
+        return docs
+
+def bench(docs, label):
+    t0 = time.perf_counter()
+    for doc in docs:
+        clean_html_advanced(doc)
+    t1 = time.perf_counter()
+    for doc in docs:
+        clean_xhtml_lxml(doc)
+    t2 = time.perf_counter()
+    size = sum(len(d) for d in docs) / 1024 / 1024
+    print(f"{label}: {len(docs)} documents, {size:.1f} MB  bs4 {t1 - t0:.2f}s  lxml {t2 - t1:.2f}s  speedup {(t1 - t0) / max(t2 - t1, 1e-9):.1f}x")
+
+def main():
+    ok = check(regression_corpus(), "regression corpus")
+    for path in sys.argv[1:]:
+        docs = spine_documents(path)
+        ok = check(docs, path) and ok
+        bench(docs, path)
+    sys.exit(0 if ok else 1)
+
+if __name__ == "__main__":
+    main()
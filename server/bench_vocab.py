@@ -0,0 +1,66 @@
+"""
+生词匹配基准：对比完整管线（改动前 /match_vocab 的做法）与快速路径（find_vocab_matches）
+的吞吐量和匹配一致性。
+
+用法：
+    python bench_vocab.py [文本文件] [词表文件]
+
+文本文件每行一段；词表文件每行一个词条。省略时使用存储中的 currentDoc 和 vocabs。
+设置环境变量 DEEPREADER_VOCAB_MODEL 可以测试其他模型（如 en_core_web_sm）。
+"""
+import sys
+import time
+from nlp_service import nlp, nlp_lemma, VocabIndex, find_vocab_matches, lemma_disabled_pipes, vocab_index
+from storage import storage
+
+def load_inputs():
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], encoding="utf-8") as f:
+            texts = [line.strip() for line in f if line.strip()]
+    else:
+        texts = [p["text"] for p in storage.get_paragraphs("currentDoc") if p.get("lang") != "zh"]
+    if len(sys.argv) > 2:
+        with open(sys.argv[2], encoding="utf-8") as f:
+            vocab_list = [{"word": line.strip(), "meaning": ""} for line in f if line.strip()]
+    else:
+        vocab_list = storage.get("vocabs") or []
+    return texts, vocab_list
+
+def run(label, func, texts):
+    start = time.perf_counter()
+    results = func(texts)
+    seconds = time.perf_counter() - start
+    chars = sum(len(t) for t in texts)
+    print(f"{label:<10} {seconds:8.2f}s  {len(texts) / seconds:9.1f} texts/s  {chars / seconds / 1000:9.1f} kchars/s")
+    return results
+
+def main():
+    texts, vocab_list = load_inputs()
+    if not texts or not vocab_list:
+        print("No texts or vocabulary to benchmark.")
+        return
+    print(f"{len(texts)} texts, {len(vocab_list)} vocabulary entries")
+    print(f"full pipeline: {nlp.pipe_names}")
+    disabled = lemma_disabled_pipes(nlp_lemma)
+    print(f"fast path:     {[p for p in nlp_lemma.pipe_names if p not in disabled]}")
+
+    # 基准路径：完整管线 + 按完整管线生成的模式
+    full_index = VocabIndex(nlp, persist=False)
+    full_index.sync(vocab_list)
+    vocab_index.sync(vocab_list)
+
+    full = run("full", lambda ts: [full_index.match(doc) for doc in nlp.pipe(ts, batch_size=100)], texts)
+    fast = run("fast", find_vocab_matches, texts)
+
+    def spans(matches):
+        return [(m["start"], m["length"], m["word"]) for m in matches]
+    same = sum(spans(a) == spans(b) for a, b in zip(full, fast))
+    print(f"agreement: {same}/{len(texts)} texts ({same / len(texts):.2%})")
+    shown = 0
+    for text, a, b in zip(texts, full, fast):
+        if spans(a) != spans(b) and shown < 5:
+            print(f"- {text[:80]!r}\n  full={spans(a)}\n  fast={spans(b)}")
+            shown += 1
+
+if __name__ == "__main__":
+    main()
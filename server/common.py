@@ -1,6 +1,11 @@
 import sys
 import os
 import socket
+import sqlite3
+import threading
+from collections import OrderedDict, deque
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+from concurrent.futures import ProcessPoolExecutor
 def disable_quick_edit_if_win():
     """
     仅在 Windows 下运行：禁用控制台的快速编辑模式，
@@ -54,4 +59,181 @@ def get_app_path():
         return application_path
     else:
         # 开发环境
-        return os.path.dirname(os.path.abspath(__file__))
\ No newline at end of file
+        return os.path.dirname(os.path.abspath(__file__))
+_process_pool = None
+_process_pool_workers = 0
+_process_pool_lock = threading.Lock()
+def get_process_pool(workers: int) -> ProcessPoolExecutor:
+    """
+    获取共享的进程池，按需创建并在程序生命周期内复用，
+    避免每次提取文档都重新启动子进程。
+    子进程异常退出后进程池不可再用（submit 会抛出 BrokenProcessPool），此时重新创建。
+    """
+    global _process_pool, _process_pool_workers
+    with _process_pool_lock:
+        if (
+            _process_pool is None
+            or _process_pool_workers != workers
+            or getattr(_process_pool, "_broken", False)
+        ):
+            if _process_pool is not None:
+                _process_pool.shutdown(wait=False, cancel_futures=True)
+            _process_pool = ProcessPoolExecutor(max_workers=workers)
+            _process_pool_workers = workers
+        return _process_pool
+def iter_pool_map(fn: Callable, args: Iterable[tuple], workers: int) -> Iterator:
+    """
+    在共享进程池中执行 fn(*a)，按提交顺序产出结果。
+    最多 workers * 2 个任务在途：args 可以惰性生成，参数和已完成的结果都不会堆积，
+    适合流式提取；生成器被关闭时取消尚未开始的任务。
+    """
+    pool = get_process_pool(workers)
+    args = iter(args)
+    pending = deque()
+    try:
+        while True:
+            while len(pending) < workers * 2:
+                task_args = next(args, None)
+                if task_args is None:
+                    break
+                pending.append(pool.submit(fn, *task_args))
+            if not pending:
+                break
+            yield pending.popleft().result()
+    finally:
+        for future in pending:
+            future.cancel()
+def shutdown_process_pool():
+    """关闭共享进程池"""
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is not None:
+            _process_pool.shutdown(wait=False, cancel_futures=True)
+            _process_pool = None
+class LRUCache:
+    """线程安全的内存 LRU 缓存，超过 max_entries 时淘汰最久未使用的条目"""
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._data:
+                return default
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+class DiskLRU:
+    """
+    磁盘 LRU：每个条目一个文件（键 + suffix），文件的 mtime 作为最近使用时间。
+    总大小在内存中累计，只有超过 max_bytes 时才扫描目录、从最久未使用的条目开始删除。
+    都是同步的文件操作，在事件循环中调用时需放到线程里。
+    """
+    def __init__(self, cache_dir: str, suffix: str, max_bytes: int):
+        self.cache_dir = cache_dir
+        self.suffix = suffix
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # 启动后第一次写入时统计
+        self._total = None
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}{self.suffix}")
+
+    def entries(self) -> List[Dict]:
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(self.suffix):
+                continue
+            try:
+                st = os.stat(os.path.join(self.cache_dir, name))
+            except OSError:
+                continue
+            entries.append({"key": name[:-len(self.suffix)], "size": st.st_size, "last_used": st.st_mtime})
+        return entries
+
+    def touch(self, key: str) -> Optional[str]:
+        """条目存在时更新最近使用时间并返回文件路径"""
+        path = self.path(key)
+        try:
+            os.utime(path)
+        except OSError:
+            return None
+        return path
+
+    def added(self, size: int):
+        """写入一个 size 字节的条目之后调用，必要时淘汰旧条目"""
+        with self._lock:
+            if self._total is None:
+                # 目录扫描已包含刚写入的文件
+                self._total = sum(e["size"] for e in self.entries())
+            else:
+                self._total += size
+            if self._total > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        entries = sorted(self.entries(), key=lambda e: e["last_used"])
+        total = sum(e["size"] for e in entries)
+        for entry in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.unlink(self.path(entry["key"]))
+                total -= entry["size"]
+            except OSError:
+                pass
+        self._total = total
+
+    def remove(self, keys: Optional[List[str]] = None) -> int:
+        """删除指定条目，未指定时清空全部，返回删除的条目数"""
+        with self._lock:
+            if keys is None:
+                keys = [e["key"] for e in self.entries()]
+            removed = 0
+            for key in keys:
+                try:
+                    os.unlink(self.path(key))
+                    removed += 1
+                except OSError:
+                    pass
+            self._total = None
+            return removed
+class SQLiteDatabase:
+    """
+    SQLite（WAL 模式）连接管理，连接在进程生命周期内保持打开：
+    每个线程复用自己的读连接，读操作可以并发；写操作共用一个写连接并通过 _write_lock 串行化。
+    """
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        self._writer = self._connect()
+
+    def _connect(self) -> sqlite3.Connection:
+        # isolation_level=None：自动提交，需要事务时显式 BEGIN
+        conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _reader(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        return conn
@@ -0,0 +1,91 @@
+# 按内容寻址的文档提取结果缓存：同一文件再次上传时直接返回上次的提取结果
+import os
+import json
+import time
+import hashlib
+import threading
+from dataclasses import asdict
+from typing import List, Dict, Optional
+from common import get_app_path, DiskLRU
+from text_processors import EXTRACTOR_VERSION, ExtractOptions
+
+class DocumentCache:
+    """
+    磁盘缓存，每个文档一个 JSON 文件。
+    键 = SHA-256(文件内容) + 扩展名 + 提取器版本 + 提取参数，
+    文件的 mtime 作为最近使用时间，总大小超过上限时按 LRU 淘汰。
+    """
+    def __init__(
+        self,
+        cache_dir: str = os.path.join(get_app_path(), "cache", "docs"),
+        max_bytes: int = 512 * 1024 * 1024
+    ):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._store = DiskLRU(cache_dir, ".json", max_bytes)
+
+    def make_key(self, file_hash: str, file_ext: str, options: Optional[ExtractOptions] = None) -> str:
+        """由文件哈希和影响提取结果的所有参数生成缓存键"""
+        if options is None:
+            options = ExtractOptions()
+        material = json.dumps({
+            "file": file_hash,
+            "ext": file_ext.lower(),
+            "version": EXTRACTOR_VERSION,
+            "options": asdict(options),
+        }, sort_keys=True)
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[List[Dict[str, str]]]:
+        # 命中时同时更新最近使用时间
+        path = self._store.touch(key)
+        if path is None:
+            self.misses += 1
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return data
+
+    def set(self, key: str, data: List[Dict[str, str]]):
+        path = self._store.path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+                size = f.tell()
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Failed to write document cache: {e}")
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            return
+        self._store.added(size)
+
+    def stats(self) -> Dict:
+        entries = sorted(self._store.entries(), key=lambda e: e["last_used"], reverse=True)
+        return {
+            "entries": len(entries),
+            "bytes": sum(e["size"] for e in entries),
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "items": [
+                {**e, "last_used": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(e["last_used"]))}
+                for e in entries
+            ],
+        }
+
+    def purge(self, key: Optional[str] = None) -> int:
+        """删除指定条目，未指定时清空全部缓存，返回删除的条目数"""
+        # 键只能是十六进制摘要，防止路径穿越
+        if key and not all(c in "0123456789abcdef" for c in key):
+            return 0
+        return self._store.remove([key] if key else None)
+doc_cache = DocumentCache()
@@ -7,35 +7,92 @@ epub是一个zip包：
 - toc.ncx：过时的导航文档格式
 - Content Documents & Assets：包含图片、字体、css、视频、音频，以及XHTML/HTML5
 """
-import ebooklib
-from ebooklib import epub
-
 from bs4 import BeautifulSoup, Comment
 import re
-from typing import List, Optional, Set
+import math
+import zipfile
+import posixpath
+from urllib.parse import unquote
+from xml.etree import ElementTree
+from typing import Iterator, List, Optional, Set, Union
 from dataclasses import dataclass
+try:
+    from lxml import etree
+except ImportError:
+    etree = None
+from common import iter_pool_map
+
+CONTAINER_PATH = 'META-INF/container.xml'
 
-def extract_epub(file_path: str) -> List[str]:
+def extract_epub(file_path: str, workers: int = 1) -> List[str]:
+    return list(iter_extract_epub(file_path, workers))
+
+def iter_extract_epub(file_path: str, workers: int = 1) -> Iterator[str]:
+    """
+    直接从 zip 中读取 container.xml 和 OPF 的 spine，按需解压内容文档，逐章产出段落。
+    图片、字体、音频等资源不会被读取，内存占用取决于最大的章节而不是整本书。
+    """
+    # 只有 container.xml、OPF 无法解析时按空书处理；章节损坏、进程池故障等错误向上抛出，
+    # 避免把不完整的结果当作成功返回并写入文档缓存
     try:
-        book = epub.read_epub(file_path)
-        paragraphs = []
-        # processed_ids = set()
-        # 1. 先按 spine 顺序处理主要内容
-        for item_id, _ in book.spine:
-            item = book.get_item_with_id(item_id)
-            if item is not None:
-                content = item.get_content()
-                paragraphs.extend(clean_html_advanced(content))
-                # processed_ids.add(item_id)
-        # 2. 可选：处理不在 spine 中的其他文档
-        # for item in book.get_items_of_type(ebooklib.ITEM_DOCUMENT):
-        #     if item.get_id() not in processed_ids:
-        #         content = item.get_content()
-        #         paragraphs.extend(clean_html_advanced(content))
-        return paragraphs
+        zf = zipfile.ZipFile(file_path)
     except Exception as e:
         print(f"Error parsing EPUB: {str(e)}")
-        return []
+        return
+    with zf:
+        try:
+            paths = _read_spine(zf)
+        except Exception as e:
+            print(f"Error parsing EPUB: {str(e)}")
+            return
+        for texts in _iter_clean_documents(zf, paths, workers):
+            yield from texts
+
+def _read_spine(zf: zipfile.ZipFile) -> List[str]:
+    """container.xml -> OPF -> spine，返回内容文档在 zip 中的路径（按阅读顺序）"""
+    container = ElementTree.fromstring(zf.read(CONTAINER_PATH))
+    opf_path = container.find('.//{*}rootfile').get('full-path')
+    opf = ElementTree.fromstring(zf.read(opf_path))
+    base = posixpath.dirname(opf_path)
+    # Manifest：id -> href（相对 OPF 所在目录，可能经过 URL 编码）
+    manifest = {item.get('id'): item.get('href') for item in opf.findall('./{*}manifest/{*}item')}
+    names = set(zf.namelist())
+    paths = []
+    for itemref in opf.findall('./{*}spine/{*}itemref'):
+        href = manifest.get(itemref.get('idref'))
+        if not href:
+            continue
+        path = posixpath.normpath(posixpath.join(base, unquote(href.split('#')[0])))
+        if path in names:
+            paths.append(path)
+    # 可选：处理不在 spine 中的其他文档（media-type 为 application/xhtml+xml 的 manifest 条目）
+    return paths
+
+def _iter_clean_documents(zf: zipfile.ZipFile, paths: List[str], workers: int = 1) -> Iterator[List[str]]:
+    """
+    按 spine 顺序产出每个内容文档的清洗结果。
+    workers > 1 时把文档分成若干连续区间交给进程池，结果按区间顺序取回；
+    去重只在单个文档内进行，所以与逐个清洗的结果相同。
+    """
+    # 每个任务的文档数：任务数约为进程数的 4 倍，兼顾负载均衡和调度开销
+    docs_per_task = max(1, min(16, math.ceil(len(paths) / max(workers, 1) / 4)))
+    if workers <= 1 or len(paths) < docs_per_task * 2:
+        for path in paths:
+            yield clean_html(zf.read(path))
+        return
+
+    # 提交任务时才解压对应的文档
+    tasks = (
+        ([zf.read(path) for path in paths[start:start + docs_per_task]],)
+        for start in range(0, len(paths), docs_per_task)
+    )
+    for texts in iter_pool_map(_clean_document_range, tasks, workers):
+        yield from texts
+
+def _clean_document_range(contents: List[bytes]) -> List[List[str]]:
+    """进程池任务：清洗一组内容文档"""
+    return [clean_html(content) for content in contents]
+
 @dataclass
 class CleanConfig:
     """清洗配置"""
@@ -59,7 +116,7 @@ class CleanConfig:
                 'nav', 'header', 'footer', 'aside', 'noscript',
                 'iframe', 'form', 'button', 'input', 'svg',
                 'canvas', 'audio', 'video', 'source', 'embed',
-                'object', 'applet', 'map', 'area'
+                'object', 'applet', 'map', 'area', 'template'
             }
         if self.content_tags is None:
             self.content_tags = {
@@ -121,8 +178,7 @@ def clean_html_advanced(
         tag.attrs = {}
     
     # 7. 提取文本
-    result = []
-    seen = set()  # 用于去重
+    texts = []
     
     body = soup.find('body') or soup
     
@@ -132,8 +188,16 @@ def clean_html_advanced(
                for parent in element.parents if parent.name):
             continue
         
-        text = element.get_text(separator=' ', strip=True)
-        
+        texts.append(element.get_text(separator=' ', strip=True))
+    
+    return _finish_texts(texts, img_alts, config)
+
+
+def _finish_texts(texts: List[str], img_alts: List[str], config: CleanConfig) -> List[str]:
+    """规范化、过滤、去重，再追加图片描述"""
+    result = []
+    seen = set()  # 用于去重
+    for text in texts:
         if config.normalize_whitespace:
             text = re.sub(r'\s+', ' ', text).strip()
         
@@ -178,4 +242,134 @@ def merge_short_texts(texts: List[str], threshold: int = 50) -> List[str]:
     if buffer:
         merged.append(' '.join(buffer))
     
-    return merged
\ No newline at end of file
+    return merged
+
+# 与 clean_html_advanced 第 4、5 步相同的噪音判断
+_NOISE_CLASS_RE = re.compile('|'.join(['footnote', 'sidebar', 'advertisement', 'ad', 'banner']), re.I)
+_HIDDEN_STYLE_RE = re.compile(r'display\s*:\s*none', re.I)
+
+def clean_html(
+    html_content: Union[str, bytes],
+    config: Optional[CleanConfig] = None
+) -> List[str]:
+    """
+    EPUB 内容文档的清洗入口：优先用 lxml 单次遍历，结果与 clean_html_advanced 相同；
+    未安装 lxml 或文档不是格式良好的 XHTML 时回退到 BeautifulSoup。
+    """
+    if etree is not None:
+        result = clean_xhtml_lxml(html_content, config)
+        if result is not None:
+            return result
+    return clean_html_advanced(html_content, config)
+
+def clean_xhtml_lxml(
+    html_content: Union[str, bytes],
+    config: Optional[CleanConfig] = None
+) -> Optional[List[str]]:
+    """
+    用 lxml 按 XML 解析，一次遍历完成删除判断和文本提取，返回 None 表示无法解析。
+
+    与 clean_html_advanced（html.parser）保持一致的细节：
+    - 图片 alt 在删除噪音之前收集，被删除的元素中的图片也算
+    - 被删除元素之后的文本（tail）保留
+    - 只有没有内容标签祖先的内容标签才输出，文本为其中所有字符串 strip 后以空格拼接
+    - 存在 body 时只取第一个 body 内的内容
+    """
+    if config is None:
+        config = CleanConfig()
+    encoding = None
+    if isinstance(html_content, str):
+        # 字符串已经解码，忽略 XML 声明中的编码
+        html_content = html_content.encode('utf-8')
+        encoding = 'utf-8'
+    parser = etree.XMLParser(huge_tree=True, resolve_entities=False, no_network=True, encoding=encoding)
+    try:
+        root = etree.fromstring(html_content, parser)
+    except (etree.XMLSyntaxError, ValueError):
+        return None
+    # 未展开的实体无法得到与 html.parser 相同的文本
+    if next(root.iter(etree.Entity), None) is not None:
+        return None
+
+    remove_tags = config.remove_tags
+    content_tags = config.content_tags
+    img_alts = []
+    candidates = []           # (文本, 是否在第一个 body 中)
+    body_state = 0            # 0: 未遇到 body，1: 在第一个 body 中，2: 第一个 body 已结束
+    body_el = None
+    removed_depth = 0         # >0 表示处于被删除的子树中
+    content_depth = 0         # >0 表示处于顶层内容标签中
+    content_in_body = False
+    strings = None
+
+    # 显式栈的深度优先遍历：(元素, 是否为结束事件)
+    stack = [(root, False)]
+    while stack:
+        el, is_end = stack.pop()
+        tag = el.tag
+        if not isinstance(tag, str):
+            # 注释和处理指令本身不算文本，但其后的 tail 属于父元素
+            if not is_end:
+                if strings is not None and removed_depth == 0 and el.tail:
+                    strings.append(el.tail)
+            continue
+
+        if is_end:
+            if removed_depth:
+                removed_depth -= 1
+                if removed_depth:
+                    continue
+            elif content_depth:
+                content_depth -= 1
+                if not content_depth:
+                    # 等价于 get_text(separator=' ', strip=True)
+                    candidates.append((' '.join(t for t in (x.strip() for x in strings) if t), content_in_body))
+                    strings = None
+                    continue
+            if el is body_el:
+                body_state = 2
+            if strings is not None and el.tail:
+                strings.append(el.tail)
+            continue
+
+        name = tag.rpartition('}')[2].lower()
+        if el.prefix:
+            name = f"{el.prefix.lower()}:{name}"
+        attrib = {k.lower(): v for k, v in el.attrib.items()} if el.attrib else {}
+
+        if name == 'img' and config.keep_img_alt:
+            alt = attrib.get('alt')
+            if alt is not None and alt.strip():
+                img_alts.append(f"[图片: {alt.strip()}]")
+
+        stack.append((el, True))
+        children = list(el)
+        stack.extend((child, False) for child in reversed(children))
+
+        if removed_depth:
+            removed_depth += 1
+            continue
+        if (
+            name in remove_tags
+            or ('class' in attrib and _NOISE_CLASS_RE.search(attrib['class']))
+            or ('style' in attrib and _HIDDEN_STYLE_RE.search(attrib['style']))
+            or 'hidden' in attrib
+        ):
+            removed_depth = 1
+            continue
+
+        if name == 'body' and body_state == 0:
+            body_state = 1
+            body_el = el
+        if content_depth:
+            content_depth += 1
+        elif name in content_tags:
+            content_depth = 1
+            content_in_body = body_state == 1
+            strings = []
+        if strings is not None and el.text:
+            strings.append(el.text)
+
+    has_body = body_el is not None
+    texts = [text for text, in_body in candidates if in_body or not has_body]
+    return _finish_texts(texts, img_alts, config)
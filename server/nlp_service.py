@@ -1,9 +1,12 @@
 import os
-from common import get_app_path
+import threading
+from common import get_app_path, LRUCache
+from storage import storage
 import spacy
-from spacy.tokens import Doc
+from spacy.tokens import Doc, Span
 from spacy.matcher import PhraseMatcher
 from spacy.util import filter_spans
+nlp = nlp2 = None
 try:
     print("Loading NLP model (en_core_web_lg)...")
     base_path = get_app_path()
@@ -15,6 +18,20 @@ try:
     nlp2 = spacy.load(model_path_2, disable=["ner"])
 except Exception as e:
     print(f"Model load failed: {e}")
+# 生词匹配使用的模型目录名：默认与主模型相同；可换成更小的模型（如 en_core_web_sm），只用来求 lemma
+VOCAB_MODEL = os.environ.get("DEEPREADER_VOCAB_MODEL", "en_core_web_lg")
+# LEMMA 匹配需要的组件：规则 lemmatizer 依赖 tagger 和 attribute_ruler 给出的词性，其余（parser 等）都可以关闭
+LEMMA_COMPONENTS = {"tok2vec", "transformer", "curated_transformer", "tagger", "attribute_ruler", "lemmatizer"}
+nlp_lemma = nlp
+if nlp and VOCAB_MODEL != "en_core_web_lg":
+    try:
+        print(f"Loading NLP model ({VOCAB_MODEL}) for vocabulary matching...")
+        nlp_lemma = spacy.load(os.path.join(get_app_path(), VOCAB_MODEL), exclude=["parser", "ner", "senter"])
+    except Exception as e:
+        print(f"Vocabulary model load failed, falling back to en_core_web_lg: {e}")
+def lemma_disabled_pipes(pipeline) -> list:
+    """生词匹配时应关闭的组件"""
+    return [name for name in pipeline.pipe_names if name not in LEMMA_COMPONENTS]
 def split_paragraphs(texts: list[str], 
                      threshold: int = 240) -> list[str]:
     """
@@ -38,53 +55,139 @@ def split_paragraphs(texts: list[str],
         else:
             result.append(text)
     return result
-# 全局缓存
-_CACHED_MATCHER = None
-_CACHED_VOCAB_ID = None
-_CACHED_PATTERNS = None  # 新增：缓存 patterns 用于建立 lemma 映射
+def split_sentences(text: str, min_chars: int = 20) -> list[str]:
+    """用 nlp2 分句，过短的句子并入下一句，供朗读时逐句合成"""
+    if not nlp2:
+        return [text]
+    sentences = []
+    pending = ""
+    for sent in nlp2(text).sents:
+        pending += sent.text_with_ws
+        if len(pending.strip()) >= min_chars:
+            sentences.append(pending.strip())
+            pending = ""
+    if pending.strip():
+        if sentences:
+            sentences[-1] += " " + pending.strip()
+        else:
+            sentences.append(pending.strip())
+    return sentences
+class VocabIndex:
+    """
+    词库的 PhraseMatcher 索引，按词条增量维护：
+    - 词库变化时对比新旧词条，只对新增/删除的部分调用 matcher.add / matcher.remove
+    - lemma 序列相同的词条共用一个 match_id，命中后直接由 match_id 找到词条
+    - 词条的 lemma 结果持久化到存储中，重启后无需重新跑 nlp.pipe
+    """
+    STORAGE_KEY = 'vocabPatterns'
 
+    def __init__(self, nlp, persist: bool = True):
+        self.nlp = nlp
+        self.persist = persist
+        self.matcher = PhraseMatcher(nlp.vocab, attr="LEMMA")
+        self.word_keys = {}      # word -> lemma key（match_id 对应的字符串）
+        self.key_refs = {}       # lemma key -> 引用该模式的词条数
+        self.key_items = {}      # lemma key -> 词库中第一个对应的词条
+        self.patterns = {}       # word -> (orths, spaces, lemmas)，用于持久化
+        self._persisted = None
+        self._lock = threading.Lock()
+        self.vocab_version = None
 
-def find_vocab_matches(vocab_list, text_list):
-    global _CACHED_MATCHER, _CACHED_VOCAB_ID, _CACHED_PATTERNS
-    
-    # 从 vocab_list 中提取 word 列表
-    words = [item["word"] for item in vocab_list]
-    
-    # 使用 words 元组计算 hash（仅用于 Matcher 缓存）
-    current_vocab_id = hash(tuple(words))
-    
-    # 判断是否需要重建 Matcher（仅当 words 变化时）
-    if _CACHED_MATCHER is None or _CACHED_VOCAB_ID != current_vocab_id:
-        _CACHED_MATCHER = PhraseMatcher(nlp.vocab, attr="LEMMA")
-        # 生成 Pattern 时禁用 parser，只保留必要的组件以获取 lemma
-        # en_core_web_trf 的 lemmatizer 需要 tagger，tagger 需要 transformer
-        # 但 parser 是用于句法分析的，生成单个词的 lemma 时不需要
-        _CACHED_PATTERNS = list(nlp.pipe(words, disable=["parser"], batch_size=1000))
-        _CACHED_MATCHER.add("VOCAB_LIST", _CACHED_PATTERNS)
-        _CACHED_VOCAB_ID = current_vocab_id
-    
-    # 每次都重新建立 lemma -> vocab_item 的映射（确保 meaning 是最新的）
-    # 这个操作开销很小，不需要缓存
-    lemma_map = {}
-    for pattern, item in zip(_CACHED_PATTERNS, vocab_list):
-        # pattern 是 Doc 对象，需要遍历 tokens 获取 lemma
-        lemma_key = " ".join([token.lemma_ for token in pattern]).lower()
-        if lemma_key not in lemma_map:
-            lemma_map[lemma_key] = item
+    def _model_id(self) -> str:
+        meta = self.nlp.meta
+        return f"{meta.get('lang')}_{meta.get('name')}-{meta.get('version')}:{','.join(self.nlp.pipe_names)}"
 
-    results = []
-    
-    for doc in nlp.pipe(text_list, batch_size=100):
-        matches = _CACHED_MATCHER(doc)
-        spans = [doc[start:end] for _, start, end in matches]
-        filtered_spans = filter_spans(spans)
-        
+    def _load_persisted(self) -> dict:
+        if not self.persist:
+            return {}
+        if self._persisted is None:
+            data = storage.get(self.STORAGE_KEY)
+            if isinstance(data, dict) and data.get("model") == self._model_id():
+                self._persisted = data.get("patterns", {})
+            else:
+                self._persisted = {}
+        return self._persisted
+
+    def _save_persisted(self):
+        storage.set(self.STORAGE_KEY, {"model": self._model_id(), "patterns": self.patterns})
+
+    def _pattern_docs(self, words: list) -> list:
+        """新增词条的模式 Doc：优先用持久化的 lemma 结果，其余交给 nlp.pipe"""
+        persisted = self._load_persisted()
+        docs = {}
+        for word in words:
+            saved = persisted.get(word)
+            if saved is not None:
+                orths, spaces, lemmas = saved
+                docs[word] = Doc(self.nlp.vocab, words=orths, spaces=spaces, lemmas=lemmas)
+        missing = [w for w in words if w not in docs]
+        # 生成 Pattern 时只保留获取 lemma 必要的组件
+        for word, doc in zip(missing, self.nlp.pipe(missing, disable=lemma_disabled_pipes(self.nlp), batch_size=1000)):
+            docs[word] = doc
+        return [docs[w] for w in words]
+
+    def refresh(self) -> int:
+        """
+        词库（存储中的 vocabs）写入过才重新同步，否则只比较一次版本号。
+        返回当前词条数。
+        """
+        version = storage.version('vocabs')
+        if version != self.vocab_version:
+            with self._lock:
+                if version != self.vocab_version:
+                    self._sync(storage.get('vocabs') or [])
+                    self.vocab_version = version
+        return len(self.word_keys)
+
+    def sync(self, vocab_list: list):
+        """使索引与给定词库一致"""
+        with self._lock:
+            self._sync(vocab_list)
+
+    def _sync(self, vocab_list: list):
+        """增量同步，调用方需持有 self._lock"""
+        words = dict.fromkeys(item["word"] for item in vocab_list)
+        removed = [w for w in self.word_keys if w not in words]
+        added = [w for w in words if w not in self.word_keys]
+
+        for word in removed:
+            key = self.word_keys.pop(word)
+            self.patterns.pop(word, None)
+            self.key_refs[key] -= 1
+            if not self.key_refs[key]:
+                del self.key_refs[key]
+                self.matcher.remove(key)
+
+        for word, doc in zip(added, self._pattern_docs(added)):
+            if not len(doc):
+                continue
+            lemmas = [token.lemma_ for token in doc]
+            key = " ".join(lemmas)
+            self.word_keys[word] = key
+            self.patterns[word] = ([t.text for t in doc], [bool(t.whitespace_) for t in doc], lemmas)
+            if key not in self.key_refs:
+                self.key_refs[key] = 0
+                self.matcher.add(key, [doc])
+            self.key_refs[key] += 1
+
+        # 同一模式对应多个词条时取词库中靠前的那个（meaning 以词库为准）
+        # match() 不加锁读取 key_items，先建好新字典再整体替换
+        key_items = {}
+        for item in vocab_list:
+            key = self.word_keys.get(item["word"])
+            if key is not None and key not in key_items:
+                key_items[key] = item
+        self.key_items = key_items
+
+        if self.persist and (removed or added):
+            self._save_persisted()
+
+    def match(self, doc) -> list:
+        matches = self.matcher(doc)
+        spans = filter_spans([Span(doc, start, end, label=match_id) for match_id, start, end in matches])
         doc_matches = []
-        for span in filtered_spans:
-            # Span 对象有 lemma_ 属性，会自动拼接所有 token 的 lemma
-            lemma_key = span.lemma_.lower()
-            vocab_item = lemma_map.get(lemma_key, {})
-            
+        for span in spans:
+            vocab_item = self.key_items.get(span.label_, {})
             doc_matches.append({
                 "start": span.start_char,
                 "length": len(span.text),
@@ -93,15 +196,124 @@ def find_vocab_matches(vocab_list, text_list):
                 "word": vocab_item.get("word", ""),
                 "meaning": vocab_item.get("meaning", "")
             })
-        
-        results.append(doc_matches)
+        return doc_matches
+vocab_index = VocabIndex(nlp_lemma) if nlp_lemma else None
+# 按文本缓存的分析结果，后台预分析和按需请求共用
+segment_cache = LRUCache(50000)
+# 值为 (词库版本, 匹配列表)，键为整段文本；词库变化后旧结果自动失效
+match_cache = LRUCache(200000)
 
+def refresh_vocab_index() -> int:
+    """按需同步词库索引，返回词条数"""
+    return vocab_index.refresh()
+
+def find_vocab_matches(text_list, docs: dict = None):
+    """
+    用当前词库索引匹配整段文本，调用前先 refresh_vocab_index。
+    docs 为已用 nlp 解析好的 {文本: Doc}，nlp_lemma 就是 nlp 时直接复用，不再解析一次。
+    """
+    version = vocab_index.vocab_version
+    results = [None] * len(text_list)
+    missing = []
+    for i, text in enumerate(text_list):
+        cached = match_cache.get(text)
+        if cached is not None and cached[0] == version:
+            results[i] = cached[1]
+        else:
+            missing.append(i)
+    if missing:
+        reusable = docs if docs and nlp_lemma is nlp else {}
+        to_parse = [i for i in missing if text_list[i] not in reusable]
+        parsed = dict(zip(to_parse, nlp_lemma.pipe([text_list[i] for i in to_parse], batch_size=100, disable=lemma_disabled_pipes(nlp_lemma))))
+        for i in missing:
+            doc = parsed[i] if i in parsed else reusable[text_list[i]]
+            results[i] = vocab_index.match(doc)
+            match_cache.set(text_list[i], (version, results[i]))
     return results
+
+def split_matches(text: str, segments: list, matches: list) -> list:
+    """
+    把整段的匹配结果按意群拆开：start 改为相对于所在意群，跨意群的匹配丢弃。
+    意群都是段落的子串且按顺序排列。
+    """
+    results = []
+    pos = 0
+    for segment in segments:
+        start = text.find(segment, pos)
+        if start < 0:
+            results.append([])
+            continue
+        end = pos = start + len(segment)
+        results.append([
+            {**m, "start": m["start"] - start}
+            for m in matches
+            if m["start"] >= start and m["start"] + m["length"] <= end
+        ])
+    return results
+
+def analyze_text(text: str, with_vocab: bool = True) -> dict:
+    """
+    同时返回意群切分和生词匹配，段落只解析一次。
+    生词在整段上匹配，再按意群拆开（start 相对于该意群），
+    与 /match_vocab 传入 paragraph 时、以及后台预分析写入缓存的结果一致，不受缓存状态影响。
+    """
+    if not nlp or not text.strip():
+        return {"segments": [], "matches": []}
+    docs = {}
+    segments = segment_texts([text], docs=docs)[0]
+    if not with_vocab or not refresh_vocab_index():
+        return {"segments": segments, "matches": [[] for _ in segments]}
+    matches = find_vocab_matches([text], docs=docs)[0]
+    return {"segments": segments, "matches": split_matches(text, segments, matches)}
+
 def segment_text_content(text: str) -> list:
     if not nlp or not text.strip():
         return []
+    segments = segment_cache.get(text)
+    if segments is None:
+        segments = segment_doc(nlp(text))
+        segment_cache.set(text, segments)
+    return segments
+
+def segment_texts(texts: list, batch_size: int = 64, n_process: int = 1, docs: dict = None) -> list:
+    """
+    批量意群切分：所有段落交给 nlp.pipe 一次处理，返回与输入一一对应的结果。
+    传入 docs 字典时收集本次解析出的 {文本: Doc}，供随后的生词匹配复用。
+    """
+    results = [[] for _ in texts]
+    if not nlp:
+        return results
+    indices = []
+    for i, text in enumerate(texts):
+        if not text or not text.strip():
+            continue
+        cached = segment_cache.get(text)
+        if cached is not None:
+            results[i] = cached
+        else:
+            indices.append(i)
+    parsed = nlp.pipe([texts[i] for i in indices], batch_size=batch_size, n_process=n_process)
+    for i, doc in zip(indices, parsed):
+        results[i] = segment_doc(doc)
+        segment_cache.set(texts[i], results[i])
+        if docs is not None:
+            docs[texts[i]] = doc
+    return results
+
+def preanalyze_texts(texts: list, batch_size: int = 32):
+    """预先计算段落的意群切分和整段的生词匹配，结果写入缓存"""
+    if not nlp:
+        return
+    texts = [t for t in texts if t and t.strip()]
+    docs = {}
+    segment_texts(texts, batch_size=batch_size, docs=docs)
+    if not refresh_vocab_index():
+        return
+    # 意群模式的匹配由整段结果拆分得到，只需匹配整段
+    find_vocab_matches(texts, docs=docs)
 
-    doc = nlp(text)
+def segment_doc(doc) -> list:
+    """对已解析的 Doc 做意群切分"""
     structured_results = []
 
     for sent in doc.sents:
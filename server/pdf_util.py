@@ -1,14 +1,18 @@
 import fitz # PyMuPDF
 import re
-from typing import List, Dict, Optional
+import math
+from itertools import islice
+from typing import List, Dict, Optional, Iterator
 from collections import defaultdict
-import statistics
+import numpy as np
+from common import iter_pool_map
 
 def extract_pdf(
     pdf_path: str,
     header_footer_margin: float = 0.08,
     side_margin: float = 0.05,
-    min_text_length: int = 3
+    min_text_length: int = 3,
+    workers: int = 1
 ) -> List[str]:
     """
     提取矢量PDF的正文内容
@@ -24,40 +28,28 @@ def extract_pdf(
         header_footer_margin: 页眉页脚边距比例 (0-0.5)
         side_margin: 左右边距比例 (0-0.5)
         min_text_length: 最小文本长度，过滤过短内容
+        workers: 并行提取页面的进程数，1 表示在当前进程中逐页提取
     
     Returns:
         字符串列表，每个元素是一个完整的段落
     """
-    doc = fitz.open(pdf_path)
-    
     # 第一遍：收集所有文本块和字体统计
     all_blocks = []
     font_size_counts = defaultdict(int)
     
-    for page_num in range(len(doc)):
-        page = doc[page_num]
-        
-        # 获取批注区域（用于排除）
-        annot_rects = _get_annotation_rects(page)
-        
-        # 提取页面文本块
-        page_blocks = _extract_page_blocks(
-            page, page_num, header_footer_margin, side_margin, annot_rects
-        )
-        
+    for page_blocks in _iter_page_blocks(
+        pdf_path, header_footer_margin, side_margin, workers
+    ):
         # 统计字体大小分布
-        for block in page_blocks:
-            font_size_counts[round(block['font_size'])] += len(block['text'])
+        _count_font_sizes(page_blocks, font_size_counts)
         
         all_blocks.extend(page_blocks)
     
-    doc.close()
-    
     if not all_blocks:
         return []
     
     # 确定正文字体大小（出现次数最多的）
-    body_font_size = max(font_size_counts.keys(), key=lambda x: font_size_counts[x])
+    body_font_size = _body_font_size(font_size_counts)
     
     # 第二遍：合并段落，处理跨页
     paragraphs = _merge_paragraphs(all_blocks, body_font_size)
@@ -72,6 +64,148 @@ def extract_pdf(
     return result
 
 
+def iter_extract_pdf(
+    pdf_path: str,
+    header_footer_margin: float = 0.08,
+    side_margin: float = 0.05,
+    min_text_length: int = 3,
+    sample_pages: int = 10,
+    workers: int = 1
+) -> Iterator[str]:
+    """
+    流式提取PDF正文，逐页处理并在段落完成后立即产出
+
+    与 extract_pdf 的区别：
+    - 不缓存全部文本块，内存占用只与当前页和未完成段落有关
+    - 正文字号先用前 sample_pages 页估计，之后每处理一页都根据累计统计修正
+
+    Args:
+        pdf_path: PDF文件路径
+        header_footer_margin: 页眉页脚边距比例 (0-0.5)
+        side_margin: 左右边距比例 (0-0.5)
+        min_text_length: 最小文本长度，过滤过短内容
+        sample_pages: 用于估计正文字号的起始页数
+        workers: 并行提取页面的进程数
+
+    Yields:
+        清理后的完整段落
+    """
+    pages = _iter_page_blocks(pdf_path, header_footer_margin, side_margin, workers)
+    font_size_counts = defaultdict(int)
+    merger = _ParagraphMerger()
+
+    def emit(page_blocks):
+        if not font_size_counts:
+            return
+        body_font_size = _body_font_size(font_size_counts)
+        for block in page_blocks:
+            for para in merger.feed(block, body_font_size):
+                cleaned = _clean_text(para)
+                if len(cleaned) >= min_text_length:
+                    yield cleaned
+
+    try:
+        # 先处理采样页，得到正文字号的初始估计
+        sampled = list(islice(pages, sample_pages))
+        for page_blocks in sampled:
+            _count_font_sizes(page_blocks, font_size_counts)
+        for page_blocks in sampled:
+            yield from emit(page_blocks)
+        sampled = None
+
+        # 剩余页面：边统计边合并
+        for page_blocks in pages:
+            _count_font_sizes(page_blocks, font_size_counts)
+            yield from emit(page_blocks)
+
+        for para in merger.flush():
+            cleaned = _clean_text(para)
+            if len(cleaned) >= min_text_length:
+                yield cleaned
+    finally:
+        pages.close()
+
+
+def _iter_page_blocks(
+    pdf_path: str,
+    header_footer_margin: float,
+    side_margin: float,
+    workers: int = 1
+) -> Iterator[List[Dict]]:
+    """
+    按页序产出每页的文本块。
+    workers > 1 时把页面切成若干连续区间交给进程池，每个子进程自行打开文档，
+    结果按区间顺序取回，保证与逐页提取的顺序一致。
+    """
+    doc = fitz.open(pdf_path)
+    try:
+        page_count = len(doc)
+        # 每个任务的页数：任务数约为进程数的 4 倍，兼顾负载均衡和调度开销
+        pages_per_task = max(1, min(32, math.ceil(page_count / max(workers, 1) / 4)))
+        if workers <= 1 or page_count < pages_per_task * 2:
+            for page_num in range(page_count):
+                yield _extract_blocks_of_page(
+                    doc, page_num, header_footer_margin, side_margin
+                )
+            return
+    finally:
+        doc.close()
+
+    tasks = (
+        (pdf_path, start, min(start + pages_per_task, page_count), header_footer_margin, side_margin)
+        for start in range(0, page_count, pages_per_task)
+    )
+    for blocks in iter_pool_map(_extract_page_range, tasks, workers):
+        yield from blocks
+
+
+def _extract_page_range(
+    pdf_path: str,
+    start: int,
+    end: int,
+    header_footer_margin: float,
+    side_margin: float
+) -> List[List[Dict]]:
+    """进程池任务：独立打开文档，提取 [start, end) 页的文本块"""
+    doc = fitz.open(pdf_path)
+    try:
+        return [
+            _extract_blocks_of_page(doc, page_num, header_footer_margin, side_margin)
+            for page_num in range(start, end)
+        ]
+    finally:
+        doc.close()
+
+
+def _extract_blocks_of_page(
+    doc,
+    page_num: int,
+    header_footer_margin: float,
+    side_margin: float
+) -> List[Dict]:
+    """提取单页的有效文本块（已排除批注区域）"""
+    page = doc[page_num]
+    
+    # 获取批注区域（用于排除）
+    annot_rects = _get_annotation_rects(page)
+    
+    # 提取页面文本块
+    return _extract_page_blocks(
+        page, page_num, header_footer_margin, side_margin, annot_rects
+    )
+
+
+def _count_font_sizes(blocks: List[Dict], font_size_counts: Dict[int, int]) -> None:
+    """按字符数累计字体大小分布"""
+    for block in blocks:
+        font_size_counts[round(block['font_size'])] += len(block['text'])
+
+
+def _body_font_size(font_size_counts: Dict[int, int]) -> int:
+    """出现次数最多的字体大小即正文字号"""
+    return max(font_size_counts.keys(), key=lambda x: font_size_counts[x])
+
+
 def _get_annotation_rects(page) -> List[fitz.Rect]:
     """获取页面所有批注的矩形区域"""
     annot_rects = []
@@ -84,16 +218,31 @@ def _get_annotation_rects(page) -> List[fitz.Rect]:
     return annot_rects
 
 
-def _is_in_annotation(rect: fitz.Rect, annot_rects: List[fitz.Rect]) -> bool:
-    """检查矩形是否与批注区域重叠"""
-    for annot_rect in annot_rects:
-        # 计算重叠比例
-        intersect = rect & annot_rect
-        if not intersect.is_empty:
-            overlap_ratio = intersect.get_area() / rect.get_area() if rect.get_area() > 0 else 0
-            if overlap_ratio > 0.5:  # 超过50%重叠则认为是批注内容
-                return True
-    return False
+def _annotation_mask(bboxes: List, annot_rects: List[fitz.Rect]) -> np.ndarray:
+    """
+    批量检查文本块是否与批注区域重叠（交集超过文本块面积的 50%），
+    返回与 bboxes 对应的布尔数组。
+    交集坐标与 MuPDF 一样按 float32 计算，结果与逐个 Rect 求交一致。
+    """
+    if not annot_rects or not bboxes:
+        return np.zeros(len(bboxes), dtype=bool)
+    blocks = np.array(bboxes, dtype=np.float64)
+    annots = np.array([tuple(r) for r in annot_rects], dtype=np.float64)
+    block_area = (
+        np.maximum(0, blocks[:, 2] - blocks[:, 0]) * np.maximum(0, blocks[:, 3] - blocks[:, 1])
+    )
+    b = blocks.astype(np.float32).astype(np.float64)[:, None, :]
+    a = annots.astype(np.float32).astype(np.float64)[None, :, :]
+    x0 = np.maximum(b[..., 0], a[..., 0])
+    y0 = np.maximum(b[..., 1], a[..., 1])
+    x1 = np.minimum(b[..., 2], a[..., 2])
+    y1 = np.minimum(b[..., 3], a[..., 3])
+    # 空的文本块与任何区域都不相交
+    block_valid = (b[..., 0] < b[..., 2]) & (b[..., 1] < b[..., 3])
+    overlaps = block_valid & (x0 < x1) & (y0 < y1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio = np.where(overlaps & (block_area[:, None] > 0), (x1 - x0) * (y1 - y0) / block_area[:, None], 0)
+    return (ratio > 0.5).any(axis=1)
 
 
 def _extract_page_blocks(
@@ -116,27 +265,26 @@ def _extract_page_blocks(
     
     blocks = []
     text_dict = page.get_text("dict", flags=fitz.TEXT_PRESERVE_WHITESPACE)
-    
-    for block in text_dict.get("blocks", []):
-        # 只处理文本块
-        if block.get("type") != 0:
-            continue
-        
-        block_rect = fitz.Rect(block["bbox"])
-        
-        # 过滤不在有效区域的块
-        if not valid_rect.intersects(block_rect):
-            continue
-        
-        # 过滤批注区域的内容
-        if _is_in_annotation(block_rect, annot_rects):
+    # 只处理文本块
+    text_blocks = [block for block in text_dict.get("blocks", []) if block.get("type") == 0]
+    # 批注区域的内容
+    in_annotation = _annotation_mask([block["bbox"] for block in text_blocks], annot_rects)
+    
+    # 整页收集每个 span 的字号、字符数和所属文本块，最后统一计算按字符数加权的平均字号
+    span_sizes = []
+    span_lengths = []
+    span_blocks = []
+    
+    for block, is_annotation in zip(text_blocks, in_annotation):
+        # 过滤不在有效区域的块和批注区域的内容
+        if is_annotation or not valid_rect.intersects(block["bbox"]):
             continue
         
         # 提取文本和字体信息
-        lines_data = []
+        block_index = len(blocks)
+        lines_text = []
         for line in block.get("lines", []):
             line_text = ""
-            line_font_sizes = []
             
             for span in line.get("spans", []):
                 text = span.get("text", "")
@@ -152,32 +300,34 @@ def _extract_page_blocks(
                 
                 if text.strip() and not is_superscript:
                     line_text += text
-                    line_font_sizes.extend([font_size] * len(text))
+                    span_sizes.append(font_size)
+                    span_lengths.append(len(text))
+                    span_blocks.append(block_index)
             
             if line_text.strip():
-                lines_data.append({
-                    'text': line_text,
-                    'font_sizes': line_font_sizes
-                })
+                lines_text.append(line_text)
         
-        if lines_data:
-            # 合并行文本
-            full_text = ' '.join(ld['text'] for ld in lines_data)
-            all_font_sizes = []
-            for ld in lines_data:
-                all_font_sizes.extend(ld['font_sizes'])
-            
-            avg_font_size = statistics.mean(all_font_sizes) if all_font_sizes else 12
-            
+        if lines_text:
             blocks.append({
-                'text': full_text,
-                'font_size': avg_font_size,
+                # 合并行文本
+                'text': ' '.join(lines_text),
+                'font_size': 12,
                 'page': page_num,
                 'y_pos': block["bbox"][1],
                 'x_pos': block["bbox"][0],
                 'height': block["bbox"][3] - block["bbox"][1]
             })
     
+    if blocks:
+        # 字号来自 MuPDF 的 float32，乘以字符数和逐项累加都是精确的，结果与 statistics.mean 相同
+        lengths = np.array(span_lengths, dtype=np.float64)
+        index = np.array(span_blocks, dtype=np.intp)
+        counts = np.bincount(index, weights=lengths, minlength=len(blocks))
+        totals = np.bincount(index, weights=np.array(span_sizes, dtype=np.float64) * lengths, minlength=len(blocks))
+        for block, count, total in zip(blocks, counts, totals):
+            if count:
+                block['font_size'] = float(total / count)
+    
     # 按位置排序（从上到下，从左到右）
     blocks.sort(key=lambda b: (round(b['y_pos'] / 20) * 20, b['x_pos']))
     
@@ -189,15 +339,30 @@ def _merge_paragraphs(blocks: List[Dict], body_font_size: float) -> List[str]:
     if not blocks:
         return []
     
+    merger = _ParagraphMerger()
     paragraphs = []
-    pending = ""
-    last_block = None
-    
     for block in blocks:
+        paragraphs.extend(merger.feed(block, body_font_size))
+    paragraphs.extend(merger.flush())
+    
+    return paragraphs
+
+
+class _ParagraphMerger:
+    """
+    增量式段落合并器：逐块输入，返回已经确定结束的段落。
+    只保留未完成段落和上一个文本块，供流式提取使用。
+    """
+    def __init__(self):
+        self.pending = ""
+        self.last_block = None
+
+    def feed(self, block: Dict, body_font_size: float) -> List[str]:
         text = block['text'].strip()
         if not text:
-            continue
+            return []
         
+        done = []
         font_size = block['font_size']
         
         # 标题检测：字体明显大于正文
@@ -206,26 +371,18 @@ def _merge_paragraphs(blocks: List[Dict], body_font_size: float) -> List[str]:
         # 小字体内容可能是注释，但也可能是正文的一部分
         is_small = font_size < body_font_size - 3
         
-        if is_title:
-            # 标题作为独立段落
-            if pending:
-                paragraphs.append(pending)
-                pending = ""
-            paragraphs.append(text)
-            last_block = block
-            continue
-        
-        if is_small:
-            # 小字体内容独立处理（可能是脚注等）
-            if pending:
-                paragraphs.append(pending)
-                pending = ""
-            paragraphs.append(text)
-            last_block = block
-            continue
+        if is_title or is_small:
+            # 标题作为独立段落；小字体内容独立处理（可能是脚注等）
+            if self.pending:
+                done.append(self.pending)
+                self.pending = ""
+            done.append(text)
+            self.last_block = block
+            return done
         
         # 正文处理
-        if pending and last_block:
+        if self.pending and self.last_block:
+            last_block = self.last_block
             same_page = block['page'] == last_block['page']
             
             # 判断垂直间距（大间距可能是新段落）
@@ -237,22 +394,24 @@ def _merge_paragraphs(blocks: List[Dict], body_font_size: float) -> List[str]:
             
             if large_gap:
                 # 大间距，可能是新段落
-                paragraphs.append(pending)
-                pending = text
-            elif _should_merge_blocks(pending, text, same_page):
-                pending = _merge_texts(pending, text)
+                done.append(self.pending)
+                self.pending = text
+            elif _should_merge_blocks(self.pending, text, same_page):
+                self.pending = _merge_texts(self.pending, text)
             else:
-                paragraphs.append(pending)
-                pending = text
+                done.append(self.pending)
+                self.pending = text
         else:
-            pending = text
+            self.pending = text
         
-        last_block = block
-    
-    if pending:
-        paragraphs.append(pending)
-    
-    return paragraphs
+        self.last_block = block
+        return done
+
+    def flush(self) -> List[str]:
+        done = [self.pending] if self.pending else []
+        self.pending = ""
+        self.last_block = None
+        return done
 
 
 def _should_merge_blocks(prev_text: str, next_text: str, same_page: bool) -> bool:
@@ -0,0 +1,89 @@
+# 文档上传后在后台预先完成意群切分和生词匹配，前端滚动到段落时直接命中缓存
+import time
+import threading
+from typing import Dict
+from storage import storage
+from nlp_service import preanalyze_texts, segment_cache, match_cache
+
+# 前端记录的阅读位置（当前页第一个可见段落的下标）
+LAST_INDEX_KEY = 'deepreader_last_index'
+
+class PreAnalyzer:
+    """
+    后台线程按阅读顺序分析整篇文档：
+    每批从前端当前阅读位置之后第一个未处理的段落开始，读完后再回到开头补齐，
+    因此用户跳转后，新位置附近的段落会优先处理。
+    """
+    def __init__(self, doc_name: str = 'currentDoc', batch_size: int = 32):
+        self.doc_name = doc_name
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        self._stop = None
+        self._thread = None
+        self._status = {"state": "idle", "total": 0, "done": 0, "elapsed": 0.0}
+
+    def start(self):
+        """（重新）开始分析当前文档，正在运行的任务会被取消"""
+        with self._lock:
+            self._cancel()
+            manifest = storage.get_document_manifest(self.doc_name)
+            count = manifest["count"] if manifest else 0
+            if not count:
+                return
+            stop = self._stop = threading.Event()
+            self._status = {"state": "running", "total": count, "done": 0, "elapsed": 0.0}
+            self._thread = threading.Thread(
+                target=self._run, args=(stop, count, self._status),
+                name="preanalysis", daemon=True
+            )
+            self._thread.start()
+
+    def stop(self):
+        with self._lock:
+            self._cancel()
+
+    def _cancel(self):
+        if self._stop is not None:
+            self._stop.set()
+            if self._status["state"] == "running":
+                self._status["state"] = "cancelled"
+
+    def _next_range(self, done: bytearray, count: int):
+        """阅读位置之后第一段连续的未处理段落，不超过一批"""
+        focus = storage.get(LAST_INDEX_KEY, 0)
+        focus = min(max(focus, 0), count - 1) if isinstance(focus, int) else 0
+        start = done.find(0, focus)
+        if start < 0:
+            start = done.find(0)
+        end = start
+        while end < count and end - start < self.batch_size and not done[end]:
+            end += 1
+        return start, end
+
+    def _run(self, stop: threading.Event, count: int, status: Dict):
+        t0 = time.perf_counter()
+        done = bytearray(count)
+        try:
+            while status["done"] < count and not stop.is_set():
+                start, end = self._next_range(done, count)
+                paragraphs = storage.get_paragraphs(self.doc_name, start, end)
+                # 与前端一致：非中文段落才有英文原文
+                preanalyze_texts([p["text"] for p in paragraphs if p.get("lang") != 'zh'], batch_size=self.batch_size)
+                done[start:end] = b"\x01" * (end - start)
+                status["done"] += end - start
+                status["elapsed"] = round(time.perf_counter() - t0, 2)
+            if not stop.is_set():
+                status["state"] = "done"
+                print(f"Pre-analysis finished: {count} paragraphs in {status['elapsed']}s")
+        except Exception as e:
+            status["state"] = "error"
+            status["error"] = str(e)
+            print(f"Pre-analysis failed: {e}")
+
+    def status(self) -> Dict:
+        return {
+            **self._status,
+            "segment_cache": len(segment_cache),
+            "match_cache": len(match_cache),
+        }
+preanalyzer = PreAnalyzer()
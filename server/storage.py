@@ -1,23 +1,140 @@
 # 像 localStorage 一样简单的存储层
-import shelve
-from contextlib import contextmanager
 import os
-from common import get_app_path
-
-class ShelveStorage:
-    def __init__(self, db_path: str = os.path.join(get_app_path(), "data")):
-        self.db_path = db_path
-    @contextmanager
-    def _open(self, flag='c'):
-        db = shelve.open(self.db_path, flag=flag)
-        try:
-            yield db
-        finally:
-            db.close()
+import dbm
+import pickle
+import shelve
+from typing import List, Optional, Dict
+from common import get_app_path, SQLiteDatabase
+
+class SQLiteStorage(SQLiteDatabase):
+    """
+    基于 SQLite（WAL 模式）的键值存储。
+    连接在进程生命周期内保持打开：每个线程复用自己的读连接，读操作可以并发；
+    写操作共用一个写连接并通过锁串行化。值用 pickle 序列化，与旧的 shelve 存储兼容。
+    """
+    def __init__(
+        self,
+        db_path: str = os.path.join(get_app_path(), "data.sqlite3"),
+        legacy_shelve_path: str = os.path.join(get_app_path(), "data")
+    ):
+        super().__init__(db_path)
+        # 每个键在本进程内的写入次数，供内存中的派生缓存判断是否过期
+        self._versions = {}
+        with self._write_lock:
+            self._writer.execute(
+                "CREATE TABLE IF NOT EXISTS kv (key TEXT PRIMARY KEY, value BLOB NOT NULL)"
+            )
+            # 文档按固定段落数分块存储，清单（段落总数、分块大小）存在 kv 表中
+            self._writer.execute(
+                "CREATE TABLE IF NOT EXISTS doc_chunks ("
+                "doc TEXT NOT NULL, idx INTEGER NOT NULL, value BLOB NOT NULL, "
+                "PRIMARY KEY (doc, idx))"
+            )
+        self._migrate_shelve(legacy_shelve_path)
+
     def get(self, key: str, default=None):
-        with self._open('c') as db:
-            return db.get(key, default)
+        row = self._reader().execute("SELECT value FROM kv WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return default
+        return pickle.loads(row[0])
+
     def set(self, key: str, value):
-        with self._open() as db:
-            db[key] = value
-storage = ShelveStorage()
\ No newline at end of file
+        # 序列化放在锁外，避免大对象阻塞其他写操作
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        with self._write_lock:
+            self._writer.execute(
+                "INSERT INTO kv (key, value) VALUES (?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+                (key, blob)
+            )
+            self._versions[key] = self._versions.get(key, 0) + 1
+
+    def version(self, key: str) -> int:
+        """键的版本号，每次写入递增"""
+        return self._versions.get(key, 0)
+
+    def set_document(self, name: str, paragraphs: List[Dict], chunk_size: int = 200):
+        """分块保存文档，读取时只需反序列化用到的分块"""
+        chunks = [
+            (name, i, pickle.dumps(paragraphs[start:start + chunk_size], protocol=pickle.HIGHEST_PROTOCOL))
+            for i, start in enumerate(range(0, len(paragraphs), chunk_size))
+        ]
+        manifest = pickle.dumps(
+            {"count": len(paragraphs), "chunk_size": chunk_size},
+            protocol=pickle.HIGHEST_PROTOCOL
+        )
+        with self._write_lock:
+            self._writer.execute("BEGIN")
+            try:
+                self._writer.execute("DELETE FROM doc_chunks WHERE doc = ?", (name,))
+                self._writer.executemany(
+                    "INSERT INTO doc_chunks (doc, idx, value) VALUES (?, ?, ?)", chunks
+                )
+                self._writer.execute(
+                    "INSERT INTO kv (key, value) VALUES (?, ?) "
+                    "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+                    (name, manifest)
+                )
+                self._writer.execute("COMMIT")
+            except Exception:
+                self._writer.execute("ROLLBACK")
+                raise
+            self._versions[name] = self._versions.get(name, 0) + 1
+
+    def get_document_manifest(self, name: str) -> Optional[Dict]:
+        """返回文档清单 {"count", "chunk_size"}，文档不存在时返回 None"""
+        manifest = self.get(name)
+        if isinstance(manifest, list):
+            # 旧版本把整个段落列表存在单个键下，首次读取时转换为分块存储
+            self.set_document(name, manifest)
+            manifest = self.get(name)
+        if not isinstance(manifest, dict) or "chunk_size" not in manifest:
+            return None
+        return manifest
+
+    def get_paragraphs(self, name: str, start: int = 0, end: Optional[int] = None) -> List[Dict]:
+        """读取文档中 [start, end) 范围内的段落，只加载覆盖该范围的分块"""
+        manifest = self.get_document_manifest(name)
+        if manifest is None:
+            return []
+        count, chunk_size = manifest["count"], manifest["chunk_size"]
+        start = max(0, start)
+        end = count if end is None else min(end, count)
+        if start >= end:
+            return []
+        first, last = start // chunk_size, (end - 1) // chunk_size
+        rows = self._reader().execute(
+            "SELECT value FROM doc_chunks WHERE doc = ? AND idx BETWEEN ? AND ? ORDER BY idx",
+            (name, first, last)
+        ).fetchall()
+        paragraphs = [p for (value,) in rows for p in pickle.loads(value)]
+        offset = first * chunk_size
+        return paragraphs[start - offset:end - offset]
+
+    def _migrate_shelve(self, shelve_path: str):
+        """首次启动时把旧的 shelve 数据导入 SQLite，导入后把旧文件改名保留"""
+        if not dbm.whichdb(shelve_path):
+            return
+        try:
+            with shelve.open(shelve_path, flag='r') as db:
+                items = [(key, pickle.dumps(db[key], protocol=pickle.HIGHEST_PROTOCOL)) for key in db.keys()]
+        except Exception as e:
+            print(f"Failed to read legacy shelve storage: {e}")
+            return
+        with self._write_lock:
+            self._writer.execute("BEGIN")
+            try:
+                self._writer.executemany(
+                    "INSERT OR IGNORE INTO kv (key, value) VALUES (?, ?)", items
+                )
+                self._writer.execute("COMMIT")
+            except Exception:
+                self._writer.execute("ROLLBACK")
+                raise
+        # shelve 在不同平台上会生成不同的文件（data / data.db / data.dat、.dir、.bak）
+        for suffix in ("", ".db", ".dat", ".dir", ".bak"):
+            path = shelve_path + suffix
+            if os.path.isfile(path):
+                os.replace(path, path + ".migrated")
+        print(f"Migrated {len(items)} keys from shelve storage to {self.db_path}")
+storage = SQLiteStorage()
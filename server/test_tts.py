@@ -0,0 +1,41 @@
+import sys
+import types
+import asyncio
+import pytest
+
+@pytest.fixture
+def tts(monkeypatch):
+    # 用按句号分句的假 nlp_service，测试不需要加载 spaCy 模型
+    nlp_service = types.ModuleType("nlp_service")
+    nlp_service.split_sentences = lambda text: [s.strip() + "." for s in text.split(".") if s.strip()]
+    monkeypatch.setitem(sys.modules, "nlp_service", nlp_service)
+    monkeypatch.delitem(sys.modules, "tts", raising=False)
+    import tts
+    return tts
+
+def fake_stream(failing: set):
+    async def generate_audio_stream(text, voice, rate="+0%"):
+        if text in failing:
+            raise RuntimeError("No audio was received")
+        for part in (b"<", text.encode(), b">"):
+            await asyncio.sleep(0)
+            yield part
+    return generate_audio_stream
+
+async def collect(stream) -> bytes:
+    return b"".join([chunk async for chunk in stream])
+
+def test_chunked_keeps_sentence_order(tts, monkeypatch):
+    monkeypatch.setattr(tts, "generate_audio_stream", fake_stream(set()))
+    audio = asyncio.run(collect(tts.generate_audio_stream_chunked("One. Two. Three.", "voice")))
+    assert audio == b"<One.><Two.><Three.>"
+
+def test_chunked_skips_failed_sentence(tts, monkeypatch):
+    monkeypatch.setattr(tts, "generate_audio_stream", fake_stream({"Two."}))
+    audio = asyncio.run(collect(tts.generate_audio_stream_chunked("One. Two. Three.", "voice")))
+    assert audio == b"<One.><Three.>"
+
+def test_chunked_raises_when_every_sentence_fails(tts, monkeypatch):
+    monkeypatch.setattr(tts, "generate_audio_stream", fake_stream({"One.", "Two."}))
+    with pytest.raises(RuntimeError):
+        asyncio.run(collect(tts.generate_audio_stream_chunked("One. Two.", "voice")))
@@ -1,56 +1,278 @@
 import os
-from typing import List, Dict
+import re
+import mmap
+import time
+import codecs
+from itertools import islice
+from dataclasses import dataclass
+from typing import List, Dict, Iterator, Iterable, Optional
 from lingua import Language, LanguageDetectorBuilder
-from epub_util import extract_epub
-from pdf_util import extract_pdf
+from epub_util import extract_epub, iter_extract_epub
+from pdf_util import extract_pdf, iter_extract_pdf
 from nlp_service import split_paragraphs
+# 提取结果的格式或算法（分段、清洗、语言标记）变化时递增，使旧的文档缓存失效
+EXTRACTOR_VERSION = 2
+@dataclass
+class ExtractOptions:
+    """影响提取结果的参数，同时用作文档缓存键的一部分"""
+    # PDF 页眉页脚边距比例
+    header_footer_margin: float = 0.08
+    # PDF 左右边距比例
+    side_margin: float = 0.05
+    # PDF 段落最小长度
+    min_text_length: int = 3
+    # 超过该长度的 PDF 段落按句拆分
+    threshold: int = 240
+    # 是否为流式提取：流式提取 PDF 时正文字号先按前 sample_pages 页估计再逐页修正，结果与整体提取不同
+    streaming: bool = False
+    # 流式提取 PDF 时用于估计正文字号的起始页数
+    sample_pages: int = 10
 detector = LanguageDetectorBuilder.from_languages(
     Language.ENGLISH, Language.CHINESE
 ).build()
-def detect_language(text: str) -> str:
-    language = detector.detect_language_of(text)
+def _language_code(language) -> str:
     if language == Language.CHINESE:
         return 'zh'
     elif language == Language.ENGLISH:
         return 'en'
     return 'other' #数字会被识别为英语、中文之外，如果按中文处理，其他小语种也能享受到英文翻译，如果不处理，可以避免莫名其妙的翻译请求，如果额外处理，莫名其妙翻译请求的情况会加倍
-def extract_with_language(file_path: str) -> List[Dict[str, str]]:
+def detect_language(text: str) -> str:
+    return detect_languages([text])[0]
+# 预分类：CJK 汉字占字母的比例达到该值时直接判为中文
+CJK_RATIO_ZH = 0.9
+_CJK_RE = re.compile(r'[\u3400-\u4dbf\u4e00-\u9fff]')
+_ASCII_LETTER_RE = re.compile(r'[A-Za-z]')
+_ASCII_OR_CJK_RE = re.compile(r'[\x00-\x7f\u3400-\u4dbf\u4e00-\u9fff]+')
+def _prefilter_language(text: str) -> Optional[str]:
+    """
+    用字符集做廉价的预判，明显的情况不再调用 lingua：
+    - 没有任何字母（纯数字、标点）-> other
+    - 只有 ASCII 字母 -> en
+    - 只含汉字和 ASCII 字母，且汉字占比高 -> zh
+    含有其他文字（假名、谚文、西里尔字母等）或中英混杂的返回 None，交给 lingua
+    """
+    if text.isascii():
+        return 'en' if _ASCII_LETTER_RE.search(text) else 'other'
+    rest = _ASCII_OR_CJK_RE.sub('', text)
+    if any(ch.isalpha() for ch in rest):
+        return None
+    cjk = len(_CJK_RE.findall(text))
+    latin = len(_ASCII_LETTER_RE.findall(text))
+    if cjk + latin == 0:
+        return 'other'
+    if cjk == 0:
+        return 'en'
+    if cjk / (cjk + latin) >= CJK_RATIO_ZH:
+        return 'zh'
+    return None
+def detect_languages(texts: List[str], stats: Optional[Dict[str, float]] = None) -> List[str]:
+    """
+    批量语言检测：先预分类，剩余的段落交给 lingua 的多线程批量接口
+    
+    Args:
+        texts: 段落列表
+        stats: 可选的统计字典，累加各方法处理的段落数和耗时
+    """
+    start = time.perf_counter()
+    langs = [_prefilter_language(text) for text in texts]
+    pending = [i for i, lang in enumerate(langs) if lang is None]
+    if stats is not None:
+        for lang in langs:
+            if lang is not None:
+                stats[f"prefilter_{lang}"] = stats.get(f"prefilter_{lang}", 0) + 1
+        stats["lingua"] = stats.get("lingua", 0) + len(pending)
+    if pending:
+        detected = detector.detect_languages_in_parallel_of([texts[i] for i in pending])
+        for i, language in zip(pending, detected):
+            langs[i] = _language_code(language)
+    if stats is not None:
+        stats["seconds"] = stats.get("seconds", 0) + time.perf_counter() - start
+    return langs
+def _format_detect_stats(stats: Dict[str, float]) -> str:
+    methods = " ".join(f"{k}={v}" for k, v in stats.items() if k != "seconds")
+    return f"{stats.get('seconds', 0):.2f}s ({methods})"
+def _tag_in_batches(paragraphs: Iterable[str], stats: Dict[str, float]) -> Iterator[Dict[str, str]]:
+    """分批标记语言；批次从小到大增长，流式场景下首批结果能尽快返回"""
+    batch_size = 8
+    batch = []
+    for para in paragraphs:
+        batch.append(para)
+        if len(batch) >= batch_size:
+            yield from _tag_batch(batch, stats)
+            batch = []
+            batch_size = min(batch_size * 2, 1024)
+    if batch:
+        yield from _tag_batch(batch, stats)
+def _tag_batch(batch: List[str], stats: Dict[str, float]) -> List[Dict[str, str]]:
+    return [
+        {"text": para, "lang": lang}
+        for para, lang in zip(batch, detect_languages(batch, stats))
+    ]
+def extract_with_language(
+    file_path: str,
+    workers: int = 1,
+    options: Optional[ExtractOptions] = None
+) -> List[Dict[str, str]]:
+    if options is None:
+        options = ExtractOptions()
+    start = time.perf_counter()
     _, file_ext = os.path.splitext(file_path.lower())
     # 提取文本段落
     if file_ext == '.txt':
-        paragraphs = extract_txt(file_path)
+        paragraphs = list(extract_txt(file_path))
     elif file_ext == '.pdf':
-        paragraphs = split_paragraphs(extract_pdf(file_path))
+        paragraphs = split_paragraphs(
+            extract_pdf(
+                file_path,
+                header_footer_margin=options.header_footer_margin,
+                side_margin=options.side_margin,
+                min_text_length=options.min_text_length,
+                workers=workers
+            ),
+            threshold=options.threshold
+        )
     elif file_ext == '.epub':
-        paragraphs = extract_epub(file_path)
+        paragraphs = extract_epub(file_path, workers=workers)
     else:
         raise ValueError(f"Unsupported file format: {file_ext}")
+    extract_seconds = time.perf_counter() - start
     # 标记语言
+    stats = {}
     result = [
         {
             "text": para,
-            "lang": detect_language(para)
+            "lang": lang
         }
-        for i, para in enumerate(paragraphs)
+        for para, lang in zip(paragraphs, detect_languages(paragraphs, stats))
     ]
+    print(f"Extracted {len(result)} paragraphs: extract {extract_seconds:.2f}s, "
+          f"language detection {_format_detect_stats(stats)}")
     return result
-def extract_txt(file_path: str) -> List[str]:
-    encodings = ['utf-8', 'gb18030', 'gbk', 'big5', 'latin-1']
-    
-    for enc in encodings:
+def iter_extract_with_language(
+    file_path: str,
+    workers: int = 1,
+    options: Optional[ExtractOptions] = None
+) -> Iterator[Dict[str, str]]:
+    """
+    extract_with_language 的流式版本：段落一经产出就立即标记语言并返回，
+    PDF 按页、EPUB 按章、TXT 按块解码流式提取
+    """
+    if options is None:
+        options = ExtractOptions(streaming=True)
+    _, file_ext = os.path.splitext(file_path.lower())
+    if file_ext == '.txt':
+        paragraphs = extract_txt(file_path)
+    elif file_ext == '.pdf':
+        paragraphs = (
+            sentence
+            for para in iter_extract_pdf(
+                file_path,
+                header_footer_margin=options.header_footer_margin,
+                side_margin=options.side_margin,
+                min_text_length=options.min_text_length,
+                sample_pages=options.sample_pages,
+                workers=workers
+            )
+            for sentence in split_paragraphs([para], threshold=options.threshold)
+        )
+    elif file_ext == '.epub':
+        paragraphs = iter_extract_epub(file_path, workers=workers)
+    else:
+        raise ValueError(f"Unsupported file format: {file_ext}")
+    start = time.perf_counter()
+    stats = {}
+    count = 0
+    for item in _tag_in_batches(paragraphs, stats):
+        count += 1
+        yield item
+    print(f"Streamed {count} paragraphs in {time.perf_counter() - start:.2f}s, "
+          f"language detection {_format_detect_stats(stats)}")
+# TXT 候选编码，按顺序尝试
+TXT_ENCODINGS = ['utf-8', 'gb18030', 'gbk', 'big5', 'latin-1']
+# 编码探测时从文件头、文件尾各采样的字节数
+TXT_SAMPLE_BYTES = 64 * 1024
+# 增量解码时每次从 mmap 读取的字节数
+TXT_CHUNK_BYTES = 1024 * 1024
+# str.splitlines 认作换行的字符
+_LINE_BREAKS = '\n\r\v\f\x1c\x1d\x1e\x85\u2028\u2029'
+def _detect_txt_encoding(data) -> str:
+    """
+    只解码文件头和文件尾的采样来判断编码，不再每个候选编码都完整解码一遍。
+    采样边界可能切在多字节字符中间：文件头不做 final 解码，文件尾依次跳过开头的 0~3 个字节。
+    """
+    if len(data) <= TXT_SAMPLE_BYTES * 2:
+        head, tail = data[:], b''
+    else:
+        head, tail = data[:TXT_SAMPLE_BYTES], data[-TXT_SAMPLE_BYTES:]
+    for enc in TXT_ENCODINGS:
         try:
-            with open(file_path, 'r', encoding=enc) as f:
-                content = f.read()
-            break
+            codecs.getincrementaldecoder(enc)().decode(head, final=not tail)
         except UnicodeDecodeError:
             continue
-    else:
-        # for 循环正常结束（所有编码都失败）才执行
-        print(f"Error: Could not decode text file {file_path}")
-        return []
-    
-    # 分割行并过滤空行（包括只有空白字符的行）
-    return [line for line in content.splitlines() if line.strip()]
+        if not tail:
+            return enc
+        for skip in range(4):
+            try:
+                tail[skip:].decode(enc)
+                return enc
+            except UnicodeDecodeError:
+                pass
+    return TXT_ENCODINGS[-1]
+def extract_txt(file_path: str) -> Iterator[str]:
+    """
+    逐行产出非空行（只有空白字符的行也会被过滤）。
+    文件通过 mmap 按块增量解码，不会同时持有整份文本和 splitlines 的副本。
+    采样之外的部分出现无法解码的字节时，与逐个尝试编码的做法一致，改用下一个候选编码从头解码，
+    跳过已经产出的行继续；这些行在新编码下不同时打印警告。
+    """
+    with open(file_path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            encodings = TXT_ENCODINGS[TXT_ENCODINGS.index(_detect_txt_encoding(data)):]
+            emitted = 0
+            segments = []  # [(编码, 用该编码产出到第几行)]
+            for i, enc in enumerate(encodings):
+                lines = _iter_decoded_lines(data, enc)
+                try:
+                    if emitted:
+                        # 完整跳过已产出的行（不能提前结束比较）
+                        changed = sum(
+                            a != b for a, b in zip(islice(lines, emitted), _emitted_lines(data, segments))
+                        )
+                        if changed:
+                            print(f"Warning: {changed} of the first {emitted} lines of {file_path} "
+                                  f"differ when decoded as {enc}")
+                    for line in lines:
+                        emitted += 1
+                        yield line
+                    return
+                except UnicodeDecodeError as e:
+                    segments.append((enc, emitted))
+                    # latin-1 总能解码，循环一定在最后一个编码之前结束
+                    print(f"Warning: {file_path} is not valid {enc} ({e.reason}), "
+                          f"restarting with {encodings[i + 1]}")
+def _emitted_lines(data, segments) -> Iterator[str]:
+    """重新解码出已经产出的行，只在换用编码时调用"""
+    start = 0
+    for enc, end in segments:
+        yield from islice(_iter_decoded_lines(data, enc), start, end)
+        start = end
+def _iter_decoded_lines(data, enc: str) -> Iterator[str]:
+    """按块增量解码，产出非空行；无法解码时抛出 UnicodeDecodeError"""
+    decoder = codecs.getincrementaldecoder(enc)()
+    pending = ''
+    for offset in range(0, len(data), TXT_CHUNK_BYTES):
+        final = offset + TXT_CHUNK_BYTES >= len(data)
+        text = pending + decoder.decode(data[offset:offset + TXT_CHUNK_BYTES], final=final)
+        lines = text.splitlines()
+        pending = ''
+        # 最后一行没有换行符时可能在下一块中继续；"\r\n" 被切开时多出的空行会被过滤掉
+        if lines and not final and text[-1] not in _LINE_BREAKS:
+            pending = lines.pop()
+        for line in lines:
+            if line.strip():
+                yield line
 # def split_paragraphs(paragraphs, max_length=220):
 #     """
 #     对段落列表进行处理：
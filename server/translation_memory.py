@@ -0,0 +1,132 @@
+# 翻译记忆：翻译过的段落持久化保存，再次请求时不访问翻译服务
+import os
+import re
+import time
+import hashlib
+import unicodedata
+from typing import Dict, List, Optional
+from common import get_app_path, SQLiteDatabase
+
+_SPACES_RE = re.compile(r"[ \t 　]+")
+
+def normalize_text(text: str) -> str:
+    """统一 Unicode 形式并压缩空白；保留换行，前端按行对齐原文和译文"""
+    text = unicodedata.normalize("NFC", text)
+    return "\n".join(_SPACES_RE.sub(" ", line).strip() for line in text.strip().splitlines())
+
+class TranslationMemory(SQLiteDatabase):
+    """
+    基于 SQLite 的翻译缓存，键 = (规范化文本, 翻译引擎, 源语言, 目标语言)。
+    条目数超过上限时按最近使用时间淘汰。
+    """
+    def __init__(
+        self,
+        db_path: str = os.path.join(get_app_path(), "cache", "translation_memory.sqlite3"),
+        max_entries: int = 200000
+    ):
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        super().__init__(db_path)
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        with self._write_lock:
+            self._writer.execute(
+                "CREATE TABLE IF NOT EXISTS tm ("
+                "key TEXT PRIMARY KEY, translator TEXT NOT NULL, from_lang TEXT NOT NULL, "
+                "to_lang TEXT NOT NULL, translation TEXT NOT NULL, last_used REAL NOT NULL)"
+            )
+            self._writer.execute("CREATE INDEX IF NOT EXISTS tm_last_used ON tm (last_used)")
+            self._writer.execute("CREATE INDEX IF NOT EXISTS tm_translator ON tm (translator)")
+            self._count = self._writer.execute("SELECT COUNT(*) FROM tm").fetchone()[0]
+
+    @staticmethod
+    def make_key(text: str, translator: str, from_lang: str, to_lang: str) -> str:
+        material = "\x00".join((normalize_text(text), translator.lower(), from_lang.lower(), to_lang.lower()))
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def get(self, text: str, translator: str, from_lang: str, to_lang: str) -> Optional[str]:
+        return self.get_many([text], translator, from_lang, to_lang)[0]
+
+    def get_many(self, texts: List[str], translator: str, from_lang: str, to_lang: str) -> List[Optional[str]]:
+        """批量查询，命中条目的最近使用时间在一个事务中更新"""
+        keys = [self.make_key(text, translator, from_lang, to_lang) for text in texts]
+        reader = self._reader()
+        results = []
+        for key in keys:
+            row = reader.execute("SELECT translation FROM tm WHERE key = ?", (key,)).fetchone()
+            results.append(row[0] if row else None)
+        hit_keys = [key for key, result in zip(keys, results) if result is not None]
+        self.hits += len(hit_keys)
+        self.misses += len(keys) - len(hit_keys)
+        if hit_keys:
+            now = time.time()
+            with self._write_lock:
+                self._writer.execute("BEGIN")
+                self._writer.executemany("UPDATE tm SET last_used = ? WHERE key = ?", [(now, key) for key in hit_keys])
+                self._writer.execute("COMMIT")
+        return results
+
+    def set(self, text: str, translator: str, from_lang: str, to_lang: str, translation: str):
+        self.set_many({text: translation}, translator, from_lang, to_lang)
+
+    def set_many(self, translations: Dict[str, str], translator: str, from_lang: str, to_lang: str):
+        """批量写入 {原文: 译文}，空译文不保存"""
+        rows = [
+            (self.make_key(text, translator, from_lang, to_lang), translation)
+            for text, translation in translations.items() if translation
+        ]
+        if not rows:
+            return
+        with self._write_lock:
+            self._writer.execute("BEGIN")
+            try:
+                for key, translation in rows:
+                    now = time.time()
+                    cur = self._writer.execute(
+                        "INSERT OR IGNORE INTO tm (key, translator, from_lang, to_lang, translation, last_used) "
+                        "VALUES (?, ?, ?, ?, ?, ?)",
+                        (key, translator.lower(), from_lang.lower(), to_lang.lower(), translation, now)
+                    )
+                    if cur.rowcount:
+                        self._count += 1
+                    else:
+                        self._writer.execute(
+                            "UPDATE tm SET translation = ?, last_used = ? WHERE key = ?",
+                            (translation, now, key)
+                        )
+                if self._count > self.max_entries:
+                    self._evict(self._count - self.max_entries)
+                self._writer.execute("COMMIT")
+            except Exception:
+                self._writer.execute("ROLLBACK")
+                raise
+
+    def _evict(self, n: int):
+        """删除最久未使用的 n 条，调用方需持有写锁"""
+        cur = self._writer.execute(
+            "DELETE FROM tm WHERE key IN (SELECT key FROM tm ORDER BY last_used LIMIT ?)", (n,)
+        )
+        self._count -= cur.rowcount
+
+    def invalidate(self, translator: Optional[str] = None) -> int:
+        """删除指定翻译引擎的全部条目，未指定时清空，返回删除的条目数"""
+        with self._write_lock:
+            if translator:
+                cur = self._writer.execute("DELETE FROM tm WHERE translator = ?", (translator.lower(),))
+            else:
+                cur = self._writer.execute("DELETE FROM tm")
+            self._count -= cur.rowcount
+            return cur.rowcount
+
+    def stats(self) -> Dict:
+        rows = self._reader().execute(
+            "SELECT translator, COUNT(*) FROM tm GROUP BY translator"
+        ).fetchall()
+        return {
+            "entries": self._count,
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "by_translator": dict(rows),
+        }
+translation_memory = TranslationMemory()
@@ -1,16 +1,25 @@
 import os
 os.environ["translators_default_region"] = "EN"
 import translators as ts
-import deepl
+import re
+import time
 import random
+import asyncio
+import threading
+from functools import partial
+from contextlib import contextmanager
+from typing import List, Dict, Optional
+import anyio
+import httpx
+import requests
 from common import get_app_path
 
-def load_deepl_key(filename="deepl_key.txt"):
+DEEPL_KEY_FILE = os.path.join(get_app_path(), "deepl_key.txt")
+
+def load_deepl_key(config_path=DEEPL_KEY_FILE):
     """
     读取并返回 API Key，如果文件不存在则创建并提示退出
     """
-    # 组合完整路径：程序根目录 + 文件名
-    config_path = os.path.join(get_app_path(), filename)
     # 检查文件是否存在
     if not os.path.exists(config_path):
         try:
@@ -36,8 +45,241 @@ def load_deepl_key(filename="deepl_key.txt"):
 # 从环境变量获取 DeepL API key
 DEEPL_API_KEY = load_deepl_key()
 
-# 不要使用并发
-def translate_text_wrapper(
+class TranslatorMetrics:
+    """各翻译引擎的调用次数、失败次数和耗时，以及 DeepL 客户端的复用情况"""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.deepl_client_builds = 0
+        self.deepl_client_reuses = 0
+        self._calls = {}
+
+    @contextmanager
+    def track(self, translator: str):
+        t0 = time.perf_counter()
+        ok = False
+        try:
+            yield
+            ok = True
+        finally:
+            elapsed = time.perf_counter() - t0
+            with self._lock:
+                m = self._calls.setdefault(translator.lower(), {"calls": 0, "errors": 0, "total_ms": 0.0, "max_ms": 0.0})
+                m["calls"] += 1
+                m["errors"] += 0 if ok else 1
+                m["total_ms"] += elapsed * 1000
+                m["max_ms"] = max(m["max_ms"], elapsed * 1000)
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {
+                "deepl_client": {"builds": self.deepl_client_builds, "reuses": self.deepl_client_reuses},
+                "calls": {
+                    name: {**m, "avg_ms": round(m["total_ms"] / m["calls"], 1), "total_ms": round(m["total_ms"], 1), "max_ms": round(m["max_ms"], 1)}
+                    for name, m in self._calls.items()
+                },
+            }
+translator_metrics = TranslatorMetrics()
+
+# translators 库是同步的，放到专用的线程限额中执行，不占用 Starlette 处理同步接口的线程池
+TRANSLATORS_THREADS = 8
+_translators_limiter = None
+
+def _get_translators_limiter() -> anyio.CapacityLimiter:
+    global _translators_limiter
+    if _translators_limiter is None:
+        _translators_limiter = anyio.CapacityLimiter(TRANSLATORS_THREADS)
+    return _translators_limiter
+
+_deepl_client = None
+_deepl_key_mtime = None
+# 正在后台关闭的旧客户端
+_closing_tasks = set()
+
+def _get_deepl_client() -> httpx.AsyncClient:
+    """
+    进程内复用同一个异步 HTTP 客户端（连接保持 keep-alive），
+    deepl_key.txt 修改后才重新读取 Key 并创建新客户端。
+    """
+    global _deepl_client, _deepl_key_mtime, DEEPL_API_KEY
+    try:
+        mtime = os.path.getmtime(DEEPL_KEY_FILE)
+    except OSError:
+        mtime = None
+    if _deepl_client is None or mtime != _deepl_key_mtime:
+        old_client = _deepl_client
+        if old_client is not None:
+            print("DeepL key file changed, rebuilding client")
+            # 旧客户端上可能还有进行中的请求，关闭放到后台；保留任务引用，避免完成前被回收
+            task = asyncio.get_running_loop().create_task(old_client.aclose())
+            _closing_tasks.add(task)
+            task.add_done_callback(_closing_tasks.discard)
+        DEEPL_API_KEY = load_deepl_key()
+        # 免费版 Key 以 :fx 结尾，使用单独的域名
+        base_url = "https://api-free.deepl.com" if DEEPL_API_KEY.endswith(":fx") else "https://api.deepl.com"
+        _deepl_client = httpx.AsyncClient(
+            base_url=base_url,
+            headers={"Authorization": f"DeepL-Auth-Key {DEEPL_API_KEY}"},
+            timeout=httpx.Timeout(30.0, connect=10.0),
+        )
+        _deepl_key_mtime = mtime
+        translator_metrics.deepl_client_builds += 1
+    else:
+        translator_metrics.deepl_client_reuses += 1
+    return _deepl_client
+
+async def close_translator_clients():
+    """程序退出时关闭 HTTP 客户端"""
+    global _deepl_client
+    if _closing_tasks:
+        await asyncio.gather(*_closing_tasks, return_exceptions=True)
+    if _deepl_client is not None:
+        await _deepl_client.aclose()
+        _deepl_client = None
+
+# 各翻译引擎的调度参数：rate 为每秒请求数（令牌桶），burst 为桶容量，concurrency 为同时进行的请求数
+ENGINE_LIMITS = {
+    'deepl': {'rate': 10.0, 'burst': 10, 'concurrency': 4},
+    'google': {'rate': 5.0, 'burst': 5, 'concurrency': 4},
+    'bing': {'rate': 3.0, 'burst': 3, 'concurrency': 2},
+    'default': {'rate': 2.0, 'burst': 2, 'concurrency': 2},
+}
+# 遇到 429/5xx 或网络错误时的重试次数和初始退避时间（秒），之后每次翻倍
+MAX_RETRIES = 3
+RETRY_BACKOFF = 0.5
+
+class TokenBucket:
+    """令牌桶限速：平均每秒 rate 个请求，最多允许 burst 个突发"""
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.capacity = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    async def acquire(self):
+        # 只在事件循环线程中调用，检查和扣减之间没有 await，不需要加锁
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+def _retry_status(e: Exception):
+    """可重试的错误返回 HTTP 状态码（网络错误返回 0），否则返回 None"""
+    status = getattr(getattr(e, "response", None), "status_code", None)
+    if status is not None:
+        return status if status == 429 or status >= 500 else None
+    if isinstance(e, (ConnectionError, TimeoutError, httpx.TransportError, requests.ConnectionError, requests.Timeout)):
+        return 0
+    return None
+
+def _retry_after(e: Exception):
+    headers = getattr(getattr(e, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return None
+
+class EngineScheduler:
+    """
+    单个翻译引擎的请求调度：令牌桶限速 + 并发上限 + 429/5xx 指数退避重试。
+    相同的请求正在进行时，后来者直接等待前一个的结果，不重复请求。
+    """
+    def __init__(self, name: str, rate: float, burst: int, concurrency: int):
+        self.name = name
+        self.bucket = TokenBucket(rate, burst)
+        self.concurrency = concurrency
+        self._slots = asyncio.Semaphore(concurrency)
+        self._inflight = {}
+        self.deduplicated = 0
+        self.retries = 0
+
+    async def run(self, key, factory):
+        """factory 每次调用返回一个新的协程，重试时重新调用"""
+        while (future := self._inflight.get(key)) is not None:
+            self.deduplicated += 1
+            try:
+                # shield：等待者被取消时不影响正在进行的请求
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                # 发起请求的一方被取消（例如其客户端断开）时共享的 future 也被取消；
+                # 等待者自己没有被取消时不传递取消，重新发起请求
+                if not future.cancelled() or asyncio.current_task().cancelling():
+                    raise
+        future = self._inflight[key] = asyncio.get_running_loop().create_future()
+        try:
+            result = await self._call_with_retry(factory)
+            future.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # 没有等待者时避免 "exception was never retrieved" 警告
+            future.exception()
+            raise
+        finally:
+            del self._inflight[key]
+
+    async def _call_with_retry(self, factory):
+        for attempt in range(MAX_RETRIES + 1):
+            async with self._slots:
+                await self.bucket.acquire()
+                try:
+                    return await factory()
+                except Exception as e:
+                    status = _retry_status(e)
+                    if status is None or attempt == MAX_RETRIES:
+                        raise
+                    error = e
+            # 退避等待时释放并发名额
+            delay = _retry_after(error) or RETRY_BACKOFF * (2 ** attempt) * random.uniform(0.5, 1.5)
+            self.retries += 1
+            print(f"{self.name} returned {status or 'network error'}, retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+    def stats(self) -> Dict:
+        return {
+            "rate": self.bucket.rate,
+            "burst": self.bucket.capacity,
+            "concurrency": self.concurrency,
+            "inflight": len(self._inflight),
+            "deduplicated": self.deduplicated,
+            "retries": self.retries,
+        }
+
+_schedulers = {}
+
+def get_scheduler(translator: str) -> EngineScheduler:
+    name = translator.lower()
+    if name not in _schedulers:
+        _schedulers[name] = EngineScheduler(name, **ENGINE_LIMITS.get(name, ENGINE_LIMITS['default']))
+    return _schedulers[name]
+
+def configure_translator(
+    translator: str,
+    rate: Optional[float] = None,
+    burst: Optional[int] = None,
+    concurrency: Optional[int] = None
+):
+    """修改某个翻译引擎的调度参数（未指定的沿用当前值），之后的请求生效"""
+    name = translator.lower()
+    limits = dict(ENGINE_LIMITS.get(name, ENGINE_LIMITS['default']))
+    for field, value in (('rate', rate), ('burst', burst), ('concurrency', concurrency)):
+        if value is not None:
+            if value <= 0:
+                raise ValueError(f"{field} must be positive")
+            limits[field] = value
+    ENGINE_LIMITS[name] = limits
+    _schedulers.pop(name, None)
+
+def scheduler_stats() -> Dict:
+    return {name: scheduler.stats() for name, scheduler in list(_schedulers.items())}
+
+async def translate_text(
     text: str, 
     translator: str, 
     to_lang: str,
@@ -45,24 +287,34 @@ def translate_text_wrapper(
 ) -> str:
     if not text:
         return ""
-    # 如果是 deepl，使用官方 API
     if translator.lower() == 'deepl':
-        try:
-            deepl_client = deepl.DeepLClient(DEEPL_API_KEY)
-            
-            # 构建参数
-            kwargs = {'target_lang': to_lang}
-            
-            # 如果指定了源语言且不是 auto，则添加 source_lang 参数
-            if from_lang and from_lang.lower() != 'auto':
-                kwargs['source_lang'] = from_lang
-            
-            result = deepl_client.translate_text(text, **kwargs)
-            return result.text
-        except Exception as e:
-            print(f"DeepL translation failed: {str(e)}")
-            raise e
-    
+        return (await _deepl_translate([text], to_lang, from_lang))[0]
+    return await get_scheduler(translator).run(
+        (text, to_lang, from_lang),
+        lambda: _translators_translate(text, translator, to_lang, from_lang)
+    )
+
+async def _deepl_translate(texts: List[str], to_lang: str, from_lang: str) -> List[str]:
+    """调用 DeepL REST API，一次请求翻译多条文本"""
+    payload = {'text': texts, 'target_lang': to_lang.upper()}
+    # 如果指定了源语言且不是 auto，则添加 source_lang 参数
+    if from_lang and from_lang.lower() != 'auto':
+        payload['source_lang'] = from_lang.upper()
+
+    async def call():
+        client = _get_deepl_client()
+        with translator_metrics.track('deepl'):
+            response = await client.post("/v2/translate", json=payload)
+            response.raise_for_status()
+        return [t["text"] for t in response.json()["translations"]]
+
+    try:
+        return await get_scheduler('deepl').run((tuple(texts), to_lang, from_lang), call)
+    except Exception as e:
+        print(f"DeepL translation failed: {str(e)}")
+        raise e
+
+async def _translators_translate(text: str, translator: str, to_lang: str, from_lang: str) -> str:
     # 其他翻译引擎使用 translators 库
     kwargs = {
         'query_text': text,
@@ -70,11 +322,80 @@ def translate_text_wrapper(
         'from_language': from_lang,
         'to_language': to_lang,
         'http_client': 'httpx',
-        'sleep_seconds': random.uniform(0.2, 0.6),
     }
     try:
-        result = ts.translate_text(**kwargs)
+        with translator_metrics.track(translator):
+            result = await anyio.to_thread.run_sync(partial(ts.translate_text, **kwargs), limiter=_get_translators_limiter())
         return result
     except Exception as e:
         print(f"Translation failed: {str(e)}")
-        raise e
\ No newline at end of file
+        raise e
+
+# translators 引擎单次请求的字符上限，多个段落用换行拼接后一起翻译
+TRANSLATE_BATCH_CHARS = 2000
+# DeepL 单次请求最多 50 条文本
+DEEPL_BATCH_SIZE = 50
+
+async def translate_batch(
+    texts: List[str],
+    translator: str,
+    to_lang: str,
+    from_lang: str = 'auto'
+) -> List[str]:
+    """批量翻译，返回的译文与输入一一对应；各批次并发提交，由调度器控制速率"""
+    results = [""] * len(texts)
+    indices = [i for i, text in enumerate(texts) if text and text.strip()]
+    if not indices:
+        return results
+    if translator.lower() == 'deepl':
+        # DeepL 原生支持列表输入，每条文本单独返回结果，不需要按行对齐
+        batches = [indices[start:start + DEEPL_BATCH_SIZE] for start in range(0, len(indices), DEEPL_BATCH_SIZE)]
+        translated = await asyncio.gather(*(
+            _deepl_translate([texts[i] for i in batch], to_lang, from_lang) for batch in batches
+        ))
+    else:
+        batches = _pack_by_chars(indices, texts)
+        translated = await asyncio.gather(*(
+            _translate_lines([texts[i] for i in batch], translator, to_lang, from_lang) for batch in batches
+        ))
+    for batch, lines in zip(batches, translated):
+        for i, line in zip(batch, lines):
+            results[i] = line
+    return results
+
+def _pack_by_chars(indices: List[int], texts: List[str]) -> List[List[int]]:
+    """按字符预算把段落分组；本身含换行的段落无法按行对齐，单独成组"""
+    batches, batch, length = [], [], 0
+    for i in indices:
+        text = texts[i]
+        multiline = "\n" in text or "\r" in text
+        if batch and (multiline or length + 1 + len(text) > TRANSLATE_BATCH_CHARS):
+            batches.append(batch)
+            batch, length = [], 0
+        batch.append(i)
+        length += len(text) + (1 if length else 0)
+        if multiline:
+            batches.append(batch)
+            batch, length = [], 0
+    if batch:
+        batches.append(batch)
+    return batches
+
+async def _translate_lines(lines: List[str], translator: str, to_lang: str, from_lang: str) -> List[str]:
+    """
+    多行拼接后一次翻译，再按行拆回。
+    译文行数对不上时对半拆分分别重试，只有出问题的那一半需要重新翻译。
+    """
+    translated = await translate_text("\n".join(lines), translator, to_lang, from_lang) or ""
+    if len(lines) == 1:
+        return [translated]
+    translated_lines = re.split(r"\r?\n", translated.strip("\r\n"))
+    if len(translated_lines) == len(lines):
+        return translated_lines
+    print(f"Translated line count mismatch ({len(translated_lines)} != {len(lines)}), splitting batch")
+    mid = len(lines) // 2
+    left, right = await asyncio.gather(
+        _translate_lines(lines[:mid], translator, to_lang, from_lang),
+        _translate_lines(lines[mid:], translator, to_lang, from_lang),
+    )
+    return left + right
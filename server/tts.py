@@ -1,5 +1,8 @@
+import asyncio
+import anyio
 import edge_tts
 from typing import AsyncGenerator
+from nlp_service import split_sentences
 
 async def generate_audio_stream(
     text: str, 
@@ -13,4 +16,53 @@ async def generate_audio_stream(
     )
     async for chunk in communicate.stream():
         if chunk["type"] == "audio":
-            yield chunk["data"]
\ No newline at end of file
+            yield chunk["data"]
+
+async def generate_audio_stream_chunked(
+    text: str,
+    voice: str,
+    rate: str = "+0%",
+    concurrency: int = 3
+) -> AsyncGenerator[bytes, None]:
+    """
+    逐句合成：句子并行请求（最多 concurrency 个），按顺序拼接成一段连续的 MP3 输出。
+    首段音频只需等待第一句合成，而不是整段。
+    某一句合成失败（例如只有标点时 edge-tts 收不到音频）时跳过该句，全部失败才报错。
+    """
+    # 分句要跑 spaCy 模型，放到线程里避免阻塞事件循环
+    sentences = await anyio.to_thread.run_sync(split_sentences, text)
+    if len(sentences) <= 1:
+        async for chunk in generate_audio_stream(text, voice, rate):
+            yield chunk
+        return
+
+    slots = asyncio.Semaphore(concurrency)
+    queues = [asyncio.Queue() for _ in sentences]
+
+    async def synthesize(sentence: str, queue: asyncio.Queue):
+        async with slots:
+            try:
+                async for chunk in generate_audio_stream(sentence, voice, rate):
+                    queue.put_nowait(chunk)
+                queue.put_nowait(None)
+            except Exception as e:
+                queue.put_nowait(e)
+
+    tasks = [asyncio.create_task(synthesize(s, q)) for s, q in zip(sentences, queues)]
+    error = None
+    produced = False
+    try:
+        for sentence, queue in zip(sentences, queues):
+            while (chunk := await queue.get()) is not None:
+                if isinstance(chunk, Exception):
+                    print(f"TTS failed for sentence {sentence[:30]!r}, skipped: {chunk}")
+                    error = chunk
+                    break
+                produced = True
+                yield chunk
+        if not produced and error is not None:
+            raise error
+    finally:
+        # 客户端断开或出错时取消尚未完成的句子
+        for task in tasks:
+            task.cancel()
@@ -0,0 +1,137 @@
+# 朗读音频的磁盘缓存：同一段文字以相同的音色和语速再次朗读时直接返回文件
+import os
+import uuid
+import asyncio
+import hashlib
+import anyio
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+from common import get_app_path, DiskLRU
+from tts import generate_audio_stream
+
+class AudioCache:
+    """
+    每段音频一个 MP3 文件，键 = SHA-256(文本 | 音色 | 语速 [| chunked])。
+    文件的 mtime 作为最近使用时间，总大小超过上限时按 LRU 淘汰。
+    未命中时边向客户端转发边在内存中收集，合成完整后才在线程中写入文件。
+    """
+    def __init__(
+        self,
+        cache_dir: str = os.path.join(get_app_path(), "cache", "tts"),
+        max_bytes: int = 256 * 1024 * 1024
+    ):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._store = DiskLRU(cache_dir, ".mp3", max_bytes)
+        # 上次运行中断留下的临时文件
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(".part"):
+                try:
+                    os.unlink(os.path.join(self.cache_dir, name))
+                except OSError:
+                    pass
+
+    @staticmethod
+    def make_key(text: str, voice: str, rate: str, chunked: bool = False) -> str:
+        # 逐句合成的音频在句间停顿上与整段合成不同，分开缓存
+        material = f"{text}|{voice}|{rate}|chunked" if chunked else f"{text}|{voice}|{rate}"
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def contains(self, key: str) -> bool:
+        return os.path.isfile(self._store.path(key))
+
+    async def get(self, key: str) -> Optional[str]:
+        """命中时返回文件路径并更新最近使用时间"""
+        path = await anyio.to_thread.run_sync(self._store.touch, key)
+        if path is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return path
+
+    async def tee(self, key: str, stream: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+        """转发音频流的同时收集数据，完整结束后写入缓存；流中途失败或客户端断开时丢弃"""
+        chunks = []
+        async for chunk in stream:
+            chunks.append(chunk)
+            yield chunk
+        if chunks:
+            await anyio.to_thread.run_sync(self._write, key, b"".join(chunks))
+
+    def _write(self, key: str, data: bytes):
+        path = self._store.path(key)
+        part_path = f"{path}.{uuid.uuid4().hex}.part"
+        try:
+            with open(part_path, "wb") as f:
+                f.write(data)
+            os.replace(part_path, path)
+        except OSError as e:
+            print(f"Failed to write TTS cache: {e}")
+            if os.path.exists(part_path):
+                os.unlink(part_path)
+            return
+        self._store.added(len(data))
+
+    def stats(self) -> Dict:
+        entries = self._store.entries()
+        return {
+            "entries": len(entries),
+            "bytes": sum(e["size"] for e in entries),
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+    def purge(self) -> int:
+        """清空缓存，返回删除的条目数"""
+        return self._store.remove()
+tts_cache = AudioCache()
+
+class AudioPrefetcher:
+    """
+    在后台预先合成接下来要朗读的段落（整段合成），写入缓存。
+    同时合成的数量受 concurrency 限制；同一段音频只合成一次，前台请求到来时等待它完成即可。
+    """
+    def __init__(self, cache: AudioCache, concurrency: int = 2):
+        self.cache = cache
+        self.concurrency = concurrency
+        self._slots = None
+        self._tasks = {}
+        self.completed = 0
+        self.failed = 0
+
+    async def schedule(self, items: List[Tuple[str, str, str]]):
+        """items 为 (文本, 音色, 语速)"""
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.concurrency)
+        keys = [self.cache.make_key(text, voice, rate) for text, voice, rate in items]
+        cached = await anyio.to_thread.run_sync(lambda: [self.cache.contains(key) for key in keys])
+        for key, is_cached, (text, voice, rate) in zip(keys, cached, items):
+            if key in self._tasks or is_cached:
+                continue
+            task = asyncio.get_running_loop().create_task(self._synthesize(key, text, voice, rate))
+            self._tasks[key] = task
+            task.add_done_callback(lambda _, key=key: self._tasks.pop(key, None))
+
+    async def _synthesize(self, key: str, text: str, voice: str, rate: str):
+        async with self._slots:
+            if await anyio.to_thread.run_sync(self.cache.contains, key):
+                return
+            try:
+                async for _ in self.cache.tee(key, generate_audio_stream(text, voice, rate)):
+                    pass
+                self.completed += 1
+            except Exception as e:
+                self.failed += 1
+                print(f"TTS prefetch failed: {e}")
+
+    async def wait(self, key: str):
+        """该音频正在预合成时等待其完成"""
+        task = self._tasks.get(key)
+        if task is not None:
+            await asyncio.shield(task)
+
+    def stats(self) -> Dict:
+        return {"pending": len(self._tasks), "completed": self.completed, "failed": self.failed}
+tts_prefetcher = AudioPrefetcher(tts_cache)
@@ -29,6 +29,36 @@ export const uploadAndExtract = (fileObj) => {
     return post(`/upload`, formData);
 };
 
+/**
+ * 流式上传：服务端以 NDJSON 逐段返回，每读到一批完整的行就回调一次
+ * @param {File} fileObj
+ * @param {(items: {text: string, lang: string}[]) => void | Promise<void>} onItems
+ */
+export const uploadAndExtractStream = async (fileObj, onItems) => {
+    const formData = new FormData();
+    formData.append('file', fileObj);
+    const response = await fetch(`/upload_stream`, { method: 'POST', body: formData });
+    if (!response.ok) throw Object.assign(new Error(`HTTP ${response.status}`), { status: response.status, data: await response.json().catch(() => undefined)});
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    const flush = async (lines) => {
+        const items = lines.filter(line => line.trim()).map(line => JSON.parse(line));
+        const error = items.find(item => item.error);
+        if (error) throw new Error(error.error);
+        if (items.length) await onItems(items);
+    };
+    while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        const lines = buffer.split('\n');
+        buffer = lines.pop();// 最后一行可能不完整，留到下一次
+        await flush(lines);
+    }
+    await flush([buffer + decoder.decode()]);
+};
+
 export const segmentSentence = (text) => {
     const payload = {
         text: text
@@ -36,6 +66,12 @@ export const segmentSentence = (text) => {
     return post(`/segment`, payload);
 };
 
+// 批量意群切分，results[i] 对应 texts[i]
+export const segmentBatch = (texts) => post(`/segment_batch`, { texts });
+
+// 意群切分 + 生词匹配一次完成，返回 {segments: string[], matches: 每个意群的匹配列表}
+export const analyzeParagraph = (text) => post(`/analyze`, { text });
+
 /*
 Args:
         vocab_list: ["run", "book"]
@@ -49,9 +85,11 @@ Args:
             [...]
         ]
  */
-export const matchVocabulary = (textList) => {
+// textList 为某段的意群时传入 paragraph（该段原文），在整段上匹配后按意群拆分，与 /analyze 一致
+export const matchVocabulary = (textList, paragraph) => {
     const payload = {
-        text_list: textList
+        text_list: textList,
+        paragraph: paragraph
     };
     return post(`/match_vocab`, payload);
 };
@@ -66,7 +104,7 @@ export const translate = (text, translator,from_lang,to_lang) => {
     return post(`/translate`, payload);
 };
 /**
- * 批量翻译函数
+ * 批量翻译函数，拼接、按行对齐和重试都在服务端完成
  * @param {string[]} paragraphs - 文本段落列表
  * @param {string} translator - 翻译器引擎
  * @param {string} from_lang - 源语言
@@ -74,85 +112,13 @@ export const translate = (text, translator,from_lang,to_lang) => {
  * @returns {Promise<string[]>} - 翻译后的段落列表，顺序与原列表一致
  */
 export const translateParagraphs = async (paragraphs, translator, from_lang, to_lang) => {
-    const results = [];
-    let currentIndex = 0;
-
-    // 遍历整个段落列表
-    while (currentIndex < paragraphs.length) {
-        // --- 步骤 1: 构建最大可能的批次 (Batch) ---
-        
-        // 从当前位置开始，初始化当前批次
-        let batch = [paragraphs[currentIndex]];
-        let currentBatchLength = paragraphs[currentIndex].length;
-        let nextIndex = currentIndex + 1;
-
-        // 向后贪婪匹配，尝试拼接更多段落，直到字数超过 2000
-        while (nextIndex < paragraphs.length) {
-            const nextPara = paragraphs[nextIndex];
-            // 预计算拼接后的长度：当前长度 + 换行符(1) + 下一段长度
-            if (currentBatchLength + 1 + nextPara.length > 2000) {
-                break; // 超过限制，停止拼接
-            }
-            
-            batch.push(nextPara);
-            currentBatchLength += 1 + nextPara.length;
-            nextIndex++;
-        }
-
-        // --- 步骤 2: 翻译并验证行数 (回溯逻辑) ---
-        
-        // 如果翻译结果行数不匹配，我们需要不断减少 batch 的大小并重试
-        while (batch.length > 0) {
-            // 用换行符拼接
-            const textPayload = batch.join('\n');
-
-            try {
-                // 调用提供的 translate 函数
-                const response = await translate(textPayload, translator, from_lang, to_lang);
-                
-                // 获取翻译结果，处理可能为空的情况
-                const translatedText = response.translated_text || "";
-                
-                // 将结果按换行符分割回列表
-                // 注意：使用正则 /\r?\n/ 兼容不同系统可能产生的回车换行
-                // 如果翻译结果是空字符串，split会返回[""]，需注意边界情况，但在非空输入下通常不会发生
-                let translatedLines = translatedText.split(/\r?\n/);
-                
-                // 某些特殊情况，如果最后一行是空行，split 可能会多出一个空字符串，视具体需求可进行 trim
-                // 这里严格按照题目要求：比较列表长度
-
-                // 检查：翻译后的行数是否等于原始批次的行数
-                if (translatedLines.length === batch.length) {
-                    // --- 情况 A: 匹配成功 ---
-                    results.push(...translatedLines);
-                    // 移动主索引，跳过已成功翻译的段落数
-                    currentIndex += batch.length;
-                    // 跳出重试循环，继续处理剩余段落
-                    break; 
-                } else {
-                    // --- 情况 B: 匹配失败 (行数不一致) ---
-                    
-                    // 边界保护：如果当前批次只剩1个段落，仍然不匹配（例如翻译器把一句话翻成了两行）
-                    // 此时无法继续减少，必须强制接受或报错。为了防止死循环，这里选择强制接受。
-                    if (batch.length === 1) {
-                        console.warn(`翻译行数不匹配且无法继续缩减 (Index: ${currentIndex})。原句: "${batch[0]}", 译文行数: ${translatedLines.length}`);
-                        results.push(...translatedLines); // 此时结果列表长度可能会发生变化，但为了程序健壮性需继续
-                        currentIndex += 1;
-                        break;
-                    }
-
-                    // 核心逻辑：如果不等于原始列表，则减少一个拼接项重新翻译
-                    batch.pop();
-                    // 循环将回到开头，使用新的（更短的）batch 重新调用 translate
-                }
-            } catch (error) {
-                console.error("翻译请求出错:", error);
-                throw error; // 根据业务需求，这里可以选择抛出异常或填入空字符串跳过
-            }
-        }
-    }
-
-    return results;
+    const response = await post(`/translate_batch`, {
+        texts: paragraphs,
+        translator: translator,
+        from_lang: from_lang,
+        to_lang: to_lang
+    });
+    return response.translations;
 };
 export function moveStrToEnd(list,str,max) {
     const index = list.indexOf(str);
@@ -287,12 +253,15 @@ export const translatorOptions = [
   { label: 'Alibaba', value: 'alibaba' },
   { label: 'Sogou', value: 'sogou' }
 ]
-export const getAudioUrl = async (abortController,text, voice, rate="+0%") => {
+// 超过该长度的段落按句并行合成
+const TTS_CHUNK_THRESHOLD = 200
+// index 为段落下标，服务端据此预合成后续段落
+export const getAudioUrl = async (abortController,text, voice, rate="+0%", index=null) => {
   try {
     const response = await fetch('/tts', { 
       method: 'POST',
       headers: { 'Content-Type': 'application/json' },
-      body: JSON.stringify({ text, voice: voice, rate }),
+      body: JSON.stringify({ text, voice: voice, rate, index, chunked: text.length > TTS_CHUNK_THRESHOLD }),
       signal: abortController.signal
     })
     if (!response.ok) throw new Error('TTS request failed')
@@ -707,6 +676,9 @@ export function smoothRefresh(options) {
 //     });
 //   }
 // })();
+// 当前文档的清单 {count}，以及按下标范围 [start, end) 读取段落
+export const getDocumentManifest = () => get(`/api/document`);
+export const getDocumentParagraphs = (start, end) => get(`/api/document/paragraphs`, { start, end });
 export async function getItem(key,defaultValue) {
     const value=await get(`/api/storage/${key}`);
     return value?value:defaultValue;